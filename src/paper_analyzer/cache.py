@@ -1,22 +1,59 @@
+import atexit
 import hashlib
 import json
 import os
-from typing import Any, Dict, Optional
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single writer assumed
+    fcntl = None  # type: ignore[assignment]
+
+
+def lock_file(f: Any, exclusive: bool) -> None:
+    """Advisory whole-file lock held until `f` is closed."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
 
 
 class JsonlCache:
-    def __init__(self, cache_dir: str) -> None:
+    """Append-only JSONL response cache loaded fully into memory.
+
+    Writes are buffered and flushed every `flush_every` entries (and on
+    `close`/exit) as one append under an exclusive file lock, so several
+    processes can share a cache directory without interleaving lines.
+    """
+
+    def __init__(self, cache_dir: str, flush_every: int = 32, fsync: bool = False) -> None:
         os.makedirs(cache_dir, exist_ok=True)
         self.cache_file = os.path.join(cache_dir, "lm_cache.jsonl")
+        self.flush_every = max(1, int(flush_every))
+        self.fsync = fsync
         self.mem: Dict[str, Any] = {}
+        # Last write/hit time per key, used by LRU eviction in `compact`
+        self.used: Dict[str, float] = {}
+        self._pending: List[str] = []
+        # Writers may be concurrent scheduler workers
+        self._lock = threading.Lock()
         if os.path.exists(self.cache_file):
             with open(self.cache_file, "r", encoding="utf-8") as f:
+                lock_file(f, exclusive=False)
                 for line in f:
                     try:
                         row = json.loads(line)
                         self.mem[row["key"]] = row["value"]
+                        self.used[row["key"]] = float(row.get("ts") or 0.0)
                     except Exception:
                         continue
+        atexit.register(self.flush)
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
 
     @staticmethod
     def make_key(payload: Dict[str, Any]) -> str:
@@ -25,11 +62,263 @@ class JsonlCache:
 
     def get(self, payload: Dict[str, Any]) -> Optional[Any]:
         key = self.make_key(payload)
-        return self.mem.get(key)
+        value = self.mem.get(key)
+        if value is not None:
+            self.used[key] = time.time()
+        return value
 
     def set(self, payload: Dict[str, Any], value: Any) -> None:
         key = self.make_key(payload)
-        self.mem[key] = value
+        now = time.time()
+        line = json.dumps({"key": key, "value": value, "ts": now}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.mem[key] = value
+            self.used[key] = now
+            self._pending.append(line)
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        blob = "".join(self._pending)
+        self._pending = []
         with open(self.cache_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n")
+            lock_file(f, exclusive=True)
+            f.write(blob)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def compact(
+        self,
+        max_entries: Optional[int] = None,
+        max_age_days: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """Rewrite the log with one line per key, evicting entries over the limits.
+
+        Entries older than `max_age_days` are dropped, then the least recently
+        used ones until at most `max_entries` rows / `max_bytes` remain.
+        Lines appended by other processes are merged in before rewriting.
+        Returns counts of lines read and entries kept.
+        """
+        with self._lock:
+            self._flush_locked()
+            if not os.path.exists(self.cache_file):
+                return {"lines": 0, "kept": 0}
+            with open(self.cache_file, "r+", encoding="utf-8") as f:
+                lock_file(f, exclusive=True)
+                rows: Dict[str, Dict[str, Any]] = {}
+                lines = 0
+                for line in f:
+                    lines += 1
+                    try:
+                        row = json.loads(line)
+                        rows[row["key"]] = row
+                    except Exception:
+                        continue
+                for key, row in rows.items():
+                    row["ts"] = max(float(row.get("ts") or 0.0), self.used.get(key, 0.0))
+                ordered = sorted(rows.values(), key=lambda r: r["ts"], reverse=True)
+                if max_age_days is not None:
+                    cutoff = time.time() - max_age_days * 86400
+                    ordered = [r for r in ordered if r["ts"] >= cutoff]
+                if max_entries is not None:
+                    ordered = ordered[: max(0, max_entries)]
+                out: List[str] = []
+                size = 0
+                for r in ordered:
+                    line = json.dumps({"key": r["key"], "value": r["value"], "ts": r["ts"]}, ensure_ascii=False) + "\n"
+                    size += len(line.encode("utf-8"))
+                    if max_bytes is not None and size > max_bytes:
+                        break
+                    out.append(line)
+                out.reverse()
+                # Rewrite in place while holding the lock so concurrent appenders wait
+                f.seek(0)
+                f.write("".join(out))
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            kept = {json.loads(line)["key"] for line in out}
+            self.mem = {k: v for k, v in self.mem.items() if k in kept}
+            self.used = {k: v for k, v in self.used.items() if k in kept}
+        return {"lines": lines, "kept": len(out)}
+
+
+class SqliteCache:
+    """Indexed LLM response cache backed by SQLite (`lm_cache.sqlite3`).
+
+    Opening is constant time: lookups go through the primary-key index and
+    only the requested value is read, nothing is loaded up front. Keys are the
+    same as `JsonlCache`, and an existing `lm_cache.jsonl` in the same
+    directory is imported once on first open. SQLite's own locking lets
+    several processes share the file.
+
+    Like `JsonlCache`, new entries and hit times are buffered and written in
+    one transaction every `flush_every` writes (and on `close`/exit).
+    """
+
+    make_key = staticmethod(JsonlCache.make_key)
+
+    def __init__(self, cache_dir: str, flush_every: int = 32, fsync: bool = False) -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_file = os.path.join(cache_dir, "lm_cache.sqlite3")
+        self.flush_every = max(1, int(flush_every))
+        self._lock = threading.Lock()
+        # Cache hits are recorded in batches for LRU eviction
+        self._hits: Dict[str, float] = {}
+        # Unwritten entries: key -> (value json, timestamp)
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        # Shared by scheduler workers; access is serialized by `_lock`
+        self._conn = sqlite3.connect(self.cache_file, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, ts REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "ts" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN ts REAL")
+        jsonl_path = os.path.join(cache_dir, "lm_cache.jsonl")
+        if os.path.exists(jsonl_path) and self._meta("migrated_jsonl") is None:
+            self.migrate_jsonl(jsonl_path)
+        atexit.register(self.flush)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+        atexit.unregister(self.flush)
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Any]:
+        key = self.make_key(payload)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return json.loads(pending[0])
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._hits[key] = time.time()
+                if len(self._hits) >= self.flush_every:
+                    self._flush_locked()
+        return json.loads(row[0]) if row else None
+
+    def set(self, payload: Dict[str, Any], value: Any) -> None:
+        key = self.make_key(payload)
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._pending[key] = (blob, time.time())
+            self._hits.pop(key, None)
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    @contextmanager
+    def _transaction(self, begin: str = "BEGIN"):
+        """Run the block in one transaction, rolled back if it raises."""
+        self._conn.execute(begin)
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _flush_locked(self) -> None:
+        if not self._pending and not self._hits:
+            return
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, ts) VALUES (?, ?, ?)",
+                [(k, blob, ts) for k, (blob, ts) in self._pending.items()],
+            )
+            self._conn.executemany("UPDATE entries SET ts = ? WHERE key = ?", [(t, k) for k, t in self._hits.items()])
+        self._pending = {}
+        self._hits = {}
+
+    def compact(
+        self,
+        max_entries: Optional[int] = None,
+        max_age_days: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """Evict entries over the limits (age, then LRU by count/size) and VACUUM."""
+        with self._lock:
+            self._flush_locked()
+            before = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            with self._transaction("BEGIN IMMEDIATE"):
+                self._evict_locked(max_entries, max_age_days, max_bytes)
+            kept = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            self._conn.execute("VACUUM")
+        return {"lines": before, "kept": kept}
+
+    def _evict_locked(
+        self, max_entries: Optional[int], max_age_days: Optional[float], max_bytes: Optional[int]
+    ) -> None:
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            self._conn.execute("DELETE FROM entries WHERE COALESCE(ts, 0) < ?", (cutoff,))
+        if max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key NOT IN "
+                "(SELECT key FROM entries ORDER BY COALESCE(ts, 0) DESC LIMIT ?)",
+                (max(0, max_entries),),
+            )
+        if max_bytes is not None:
+            size = 0
+            evict: List[str] = []
+            for key, length in self._conn.execute(
+                "SELECT key, LENGTH(key) + LENGTH(value) FROM entries ORDER BY COALESCE(ts, 0) DESC"
+            ):
+                size += length
+                if size > max_bytes:
+                    evict.append(key)
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in evict])
+
+    def migrate_jsonl(self, jsonl_path: str) -> int:
+        """Import a JsonlCache file (later lines win); returns the number of rows read."""
+        count = 0
+
+        def _rows():
+            nonlocal count
+            with open(jsonl_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        yield row["key"], json.dumps(row["value"], ensure_ascii=False), row.get("ts")
+                    except Exception:
+                        continue
+                    count += 1
+
+        with self._lock, self._transaction():
+            self._conn.executemany("INSERT OR REPLACE INTO entries (key, value, ts) VALUES (?, ?, ?)", _rows())
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_jsonl', ?)",
+                (os.path.abspath(jsonl_path),),
+            )
+        return count
+
+    def _meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+
+Cache = Union[JsonlCache, SqliteCache]
+
 
+def open_cache(cache_dir: str, backend: str = "sqlite", flush_every: int = 32, fsync: bool = False) -> Cache:
+    """Open the LLM response cache in `cache_dir` with the given backend."""
+    if backend == "jsonl":
+        return JsonlCache(cache_dir, flush_every=flush_every, fsync=fsync)
+    if backend == "sqlite":
+        return SqliteCache(cache_dir, flush_every=flush_every, fsync=fsync)
+    raise ValueError(f"unknown cache backend: {backend}")
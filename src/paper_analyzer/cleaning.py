@@ -0,0 +1,139 @@
+import math
+import re
+from collections import Counter
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from .text_utils import estimate_tokens
+
+# Running headers/footers sit in the first or last few lines of a page
+_EDGE_LINES = 3
+_PAGE_NUMBER_RE = re.compile(r"^\s*(?:page\s*)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_REFERENCES_RE = re.compile(
+    r"^\s*(?:[0-9ivx]+\.?\s+)?(?:references|bibliography|works cited|literature cited|참고\s*문헌)\s*:?\s*$",
+    re.IGNORECASE,
+)
+_APPENDIX_RE = re.compile(
+    r"^\s*(?:[a-z0-9]\.?\s+)?(?:appendix|appendices|supplementary materials?|부록)\b[^.]{0,60}$",
+    re.IGNORECASE,
+)
+_HYPHEN_RE = re.compile(r"([a-z])-\n(?=[a-z])")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+# A references heading this early is a table of contents entry
+_MIN_BODY_CHARS = 2000
+
+
+def _line_key(line: str) -> str:
+    """Header identity ignoring case, spacing and page numbers."""
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+
+def _edge_indexes(lines: List[str]) -> List[int]:
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    # On a short page (slides, captions) every line would be an "edge"
+    if len(filled) <= 2 * _EDGE_LINES:
+        return []
+    return filled[:_EDGE_LINES] + filled[_EDGE_LINES:][-_EDGE_LINES:]
+
+
+def _ink(text: str) -> int:
+    return len("".join(text.split()))
+
+
+def find_repeated_lines(pages: List[str], min_share: float = 0.4) -> Set[str]:
+    """Keys of lines found at the top or bottom of many pages (running headers/footers)."""
+    if len(pages) < 3:
+        return set()
+    counts: Counter = Counter()
+    for page in pages:
+        lines = page.splitlines()
+        counts.update({_line_key(lines[i]) for i in _edge_indexes(lines)})
+    threshold = max(2, math.ceil(len(pages) * min_share))
+    return {key for key, n in counts.items() if n >= threshold and key}
+
+
+def clean_pages(
+    pages: Iterable[str],
+    drop_references: bool = False,
+    drop_appendix: bool = False,
+    stats: Optional[Dict] = None,
+    sample_pages: int = 12,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """Strip extraction noise from page texts and stream the result.
+
+    Removes running headers/footers (lines repeated at the edges of the first
+    `sample_pages` pages) and bare page numbers, joins words hyphenated across
+    line breaks and squeezes blank lines. Optionally drops everything after a
+    references heading (up to an appendix heading unless `drop_appendix`) and
+    the appendix itself. Pages are joined with a newline, like the raw text.
+    A page that would lose most of its text to header/footer removal is kept
+    as is: the repeated lines are its content, not noise.
+
+    `stats`, if given, is filled with character/token counts before and after
+    cleaning; it is complete once the output is exhausted.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(chars_before=0, chars_after=0, tokens_before=0, tokens_after=0, dropped=[])
+    it = iter(pages)
+    sample = list(islice(it, max(1, sample_pages)))
+    repeated = find_repeated_lines(sample)
+
+    section = "body"
+    pending = ""
+
+    def _clean(page: str) -> str:
+        nonlocal section
+        lines = page.splitlines()
+        noise = {i for i in _edge_indexes(lines) if _PAGE_NUMBER_RE.match(lines[i]) or _line_key(lines[i]) in repeated}
+        if 2 * sum(_ink(lines[i]) for i in noise) > _ink(page):
+            noise = set()
+        kept: List[str] = []
+        for i, line in enumerate(lines):
+            if i in noise:
+                continue
+            if section == "body" and _REFERENCES_RE.match(line) and stats["chars_after"] + sum(map(len, kept)) >= _MIN_BODY_CHARS:
+                section = "references"
+                if drop_references:
+                    stats["dropped"].append("references")
+            elif section != "appendix" and _APPENDIX_RE.match(line) and stats["chars_after"] >= _MIN_BODY_CHARS:
+                section = "appendix"
+                if drop_appendix:
+                    stats["dropped"].append("appendix")
+            if (section == "references" and drop_references) or (section == "appendix" and drop_appendix):
+                continue
+            kept.append(line)
+        text = _HYPHEN_RE.sub(r"\1", "\n".join(kept))
+        return _BLANK_LINES_RE.sub("\n\n", text)
+
+    def _emit(text: str) -> str:
+        stats["chars_after"] += len(text)
+        stats["tokens_after"] += count_tokens(text)
+        return text
+
+    for i, page in enumerate(_chain(sample, it)):
+        stats["chars_before"] += len(page) + (1 if i else 0)
+        stats["tokens_before"] += count_tokens(page)
+        text = _clean(page)
+        if not text.strip():
+            continue
+        if not pending:
+            pending = text
+            continue
+        # A word hyphenated across the page break
+        tail = pending.rstrip()
+        if tail.endswith("-") and tail[-2:-1].islower() and text.lstrip()[:1].islower():
+            yield _emit(tail[:-1])
+            pending = text.lstrip()
+        else:
+            yield _emit(pending + "\n")
+            pending = text
+    if pending:
+        yield _emit(pending)
+
+
+def _chain(first: List[str], rest: Iterator[str]) -> Iterator[str]:
+    # Release sampled pages as they are consumed
+    while first:
+        yield first.pop(0)
+    yield from rest
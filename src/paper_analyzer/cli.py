@@ -1,21 +1,40 @@
 import argparse
 import glob
+import multiprocessing
 import os
+import re
 import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
 from typing import Dict, List, Optional
 
+import fitz  # PyMuPDF
+import numpy as np
 from rich.console import Console
+from rich.console import Group
 from rich.live import Live
 from rich.table import Table
 from rich import box
 from rich.panel import Panel
 from rich.prompt import Prompt, IntPrompt, FloatPrompt, Confirm
 
-from .pdf_utils import extract_pdf
-from .cache import JsonlCache
+from .manifest import ExtractionManifest
+from .cleaning import clean_pages
+from .progress import JsonlProgress, ProgressState, format_counts
+from .pdf_utils import PAGE_BREAK, extractor_fingerprint, slugify, iter_extract_pdfs, iter_paper_pages, join_pages
+from .cache import open_cache
+from .incremental import CorpusState, incremental_corpus_synthesis, update_similarity_and_clusters
 from .lmstudio import LMStudioClient
-from .summarize import summarize_single_paper, synthesize_corpus_summary
-from .report import generate_report
+from .scheduler import LLMTaskScheduler
+from .summarize import combine_token_budget, schedule_paper_summary, synthesize_corpus
+from .text_utils import chunk_text, chunk_text_tokens, get_tokenizer, iter_chunks_structured, iter_chunks_structured_tokens
+from .report import compute_similarity_and_clusters, generate_report, generate_sharded_report, select_representative
+from .thumbnails import make_thumbnails
+from .vectors import VectorIndex, index_space, make_embedder
+
+SUMMARY_FAILED = "요약 생성 실패 (LM Studio 서버 동작 여부 확인 필요)"
 
 
 def find_pdfs(input_dir: str) -> List[str]:
@@ -26,28 +45,264 @@ def find_pdfs(input_dir: str) -> List[str]:
     return sorted(list(set(paths)))
 
 
+def compact_cache_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="cli cache-compact", description="LLM 캐시에서 중복/오래된 항목을 정리"
+    )
+    parser.add_argument("--artifacts-dir", default="artifacts", help="아티팩트 폴더")
+    parser.add_argument("--cache-backend", choices=["sqlite", "jsonl"], default="sqlite", help="LLM 캐시 저장 방식")
+    parser.add_argument("--max-entries", type=int, default=None, help="최근 사용 순으로 남길 최대 항목 수")
+    parser.add_argument("--max-age-days", type=float, default=None, help="이 기간(일)보다 오래 사용되지 않은 항목 삭제")
+    parser.add_argument("--max-size-mb", type=float, default=None, help="캐시 최대 크기(MB), 초과분은 오래된 순으로 삭제")
+    args = parser.parse_args(argv)
+
+    console = Console()
+    cache = open_cache(os.path.join(args.artifacts_dir, "cache"), args.cache_backend)
+    max_bytes = int(args.max_size_mb * 1024 * 1024) if args.max_size_mb is not None else None
+    stats = cache.compact(max_entries=args.max_entries, max_age_days=args.max_age_days, max_bytes=max_bytes)
+    cache.close()
+    console.print(f"[green]캐시 정리 완료:[/green] {cache.cache_file} ({stats['lines']} → {stats['kept']} 항목)")
+    return 0
+
+
+def bench_chunking_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="cli chunk-bench", description="추출된 텍스트로 고정 길이 청크와 구조 단위 청크를 비교"
+    )
+    parser.add_argument("--artifacts-dir", default="artifacts", help="아티팩트 폴더 (clean_text/*.txt 사용)")
+    parser.add_argument("--max-chars", type=int, default=4000, help="청크 최대 문자수")
+    parser.add_argument("--max-tokens", type=int, default=None, help="지정 시 토큰 기준으로 비교")
+    parser.add_argument("--tokenizer", default="heuristic", help="토큰 계산 방식: 'heuristic' 또는 'tiktoken[:인코딩]'")
+    parser.add_argument("--repeat", type=int, default=3, help="시간 측정 반복 횟수(최솟값 사용)")
+    args = parser.parse_args(argv)
+
+    console = Console()
+    paths = sorted(glob.glob(os.path.join(args.artifacts_dir, "clean_text", "*.txt")))
+    if not paths:
+        console.print(f"[red]추출된 텍스트가 없습니다: {args.artifacts_dir}/clean_text[/red]")
+        return 1
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append("".join(join_pages(f.read().split(PAGE_BREAK))))
+
+    count_tokens = get_tokenizer(args.tokenizer)
+    if args.max_tokens:
+        size = count_tokens
+        strategies = {
+            "fixed": lambda t: chunk_text_tokens(t, args.max_tokens, count_tokens=count_tokens),
+            "structure": lambda t: list(iter_chunks_structured_tokens([t], args.max_tokens, count_tokens=count_tokens)),
+        }
+    else:
+        size = len
+        strategies = {
+            "fixed": lambda t: chunk_text(t, max_chars=args.max_chars),
+            "structure": lambda t: list(iter_chunks_structured([t], max_chars=args.max_chars)),
+        }
+
+    table = Table(box=box.SIMPLE_HEAVY)
+    for col in ("Chunker", "Chunks", "Input", "Duplicated", "Sentence ends", "Time"):
+        table.add_column(col, justify="right")
+    source = sum(size(t) for t in texts)
+    for name, fn in strategies.items():
+        elapsed = float("inf")
+        for _ in range(max(1, args.repeat)):
+            start = time.perf_counter()
+            chunked = [fn(t) for t in texts]
+            elapsed = min(elapsed, time.perf_counter() - start)
+        chunks = [c for cs in chunked for c in cs]
+        sent = sum(1 for c in chunks if re.search(r"[.!?。！？][\"')\]]*\s*$", c))
+        total = sum(size(c) for c in chunks)
+        table.add_row(
+            name,
+            str(len(chunks)),
+            f"{total:,}",
+            f"{total - source:,} ({(total - source) / max(1, source):.1%})",
+            f"{sent / max(1, len(chunks)):.0%}",
+            f"{elapsed * 1000:.1f} ms",
+        )
+    unit = "토큰" if args.max_tokens else "문자"
+    console.print(table)
+    console.print(f"{len(texts)}개 문서, 원문 {source:,} {unit}")
+    return 0
+
+
+def paper_vectors(
+    index: VectorIndex, results: List[Dict], embed
+) -> Optional[np.ndarray]:
+    """Vectors of every result (title + summary), storing those with a real summary in `index`.
+
+    Returns None when no paper has a summary: there is nothing to compare.
+    """
+    ok: List[int] = []
+    rest: List[int] = []
+    for i, r in enumerate(results):
+        (ok if r["summary"] != SUMMARY_FAILED else rest).append(i)
+    if not ok:
+        return None
+    texts = [f"{r['metadata'].get('title') or r['paper_id']}\n{r['summary']}" for r in results]
+    stored = index.update(
+        [{"paper_id": results[i]["paper_id"], "title": results[i]["metadata"].get("title"), "text": texts[i]} for i in ok],
+        embed,
+    )
+    vectors = np.zeros((len(results), stored.shape[1]), dtype=np.float32)
+    vectors[ok] = stored
+    if rest:
+        vectors[rest] = embed([texts[i] for i in rest])
+    return vectors
+
+
+def _pdf_query_text(pdf_path: str, max_chars: int = 4000) -> str:
+    doc = fitz.open(pdf_path)
+    try:
+        parts = [(doc.metadata or {}).get("title") or os.path.splitext(os.path.basename(pdf_path))[0]]
+        used = 0
+        for page in doc:
+            if used >= max_chars:
+                break
+            text = page.get_text("text")
+            parts.append(text)
+            used += len(text)
+        return "\n".join(parts)[:max_chars]
+    finally:
+        doc.close()
+
+
+def similar_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="cli similar", description="저장된 논문 벡터 인덱스에서 유사한 논문 검색 (보고서 재생성 없음)"
+    )
+    parser.add_argument("query", nargs="?", default=None, help="검색할 텍스트")
+    parser.add_argument("--pdf", default=None, help="이 PDF와 유사한 논문 검색")
+    parser.add_argument("--paper-id", default=None, help="인덱스에 있는 논문 ID로 검색")
+    parser.add_argument("--artifacts-dir", default="artifacts", help="아티팩트 폴더")
+    parser.add_argument("-k", "--top-k", type=int, default=5, help="결과 수")
+    parser.add_argument("--vectors", choices=["hashing", "embeddings"], default="hashing", help="검색할 벡터 공간")
+    parser.add_argument("--embedding-model", default="text-embedding-nomic-embed-text-v1.5", help="임베딩 모델명")
+    parser.add_argument("--lmstudio-url", default=os.getenv("LMSTUDIO_BASE_URL", "http://localhost:1234/v1"), help="LM Studio base URL")
+    args = parser.parse_args(argv)
+
+    console = Console()
+    if sum(x is not None for x in (args.query, args.pdf, args.paper_id)) != 1:
+        console.print("[red]검색어, --pdf, --paper-id 중 하나를 지정하세요.[/red]")
+        return 2
+    index = VectorIndex(args.artifacts_dir, index_space(args.vectors, args.embedding_model))
+    if not len(index):
+        console.print(f"[red]벡터 인덱스가 비어 있습니다: {index.dir} (먼저 분석을 실행하세요)[/red]")
+        return 1
+
+    start = time.perf_counter()
+    exclude = None
+    query = None
+    if args.paper_id:
+        query = index.vector_for(args.paper_id)
+        exclude = args.paper_id
+        if query is None:
+            console.print(f"[red]인덱스에 없는 논문 ID: {args.paper_id}[/red]")
+            return 1
+    else:
+        if args.pdf:
+            # Already indexed PDFs are looked up by their paper id
+            exclude = slugify(os.path.splitext(os.path.basename(args.pdf))[0])
+            query = index.vector_for(exclude)
+        if args.query or query is None:
+            client = None
+            if args.vectors == "embeddings":
+                client = LMStudioClient(model=args.embedding_model, base_url=args.lmstudio_url, cache=None)
+            text = args.query if args.query else _pdf_query_text(args.pdf)
+            query = make_embedder(args.vectors, client, args.embedding_model)([text])[0]
+            if client:
+                client.close()
+    hits = index.search(query, k=args.top_k, exclude=exclude)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    table = Table(box=box.SIMPLE_HEAVY)
+    table.add_column("#", justify="right")
+    table.add_column("Paper")
+    table.add_column("Title", overflow="fold")
+    table.add_column("Similarity", justify="right")
+    for rank, (pid, title, score) in enumerate(hits, 1):
+        table.add_row(str(rank), pid, title or "-", f"{score:.3f}")
+    console.print(table)
+    console.print(f"{len(index)}편 중 검색, {elapsed:.1f} ms")
+    return 0
+
+
 def main(argv: List[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "similar":
+        return similar_main(argv[1:])
+    if argv and argv[0] == "chunk-bench":
+        return bench_chunking_main(argv[1:])
+    if argv and argv[0] == "cache-compact":
+        return compact_cache_main(argv[1:])
+
     parser = argparse.ArgumentParser(description="논문 폴더를 분석하여 종합 보고서를 생성")
     parser.add_argument("--input-dir", required=True, help="PDF 폴더 경로")
     parser.add_argument("--artifacts-dir", default="artifacts", help="아티팩트 출력 폴더")
     parser.add_argument("--report-dir", default="report", help="보고서 출력 폴더")
     parser.add_argument("--model", default="openai/gpt-oss-20b", help="LM Studio 모델명")
-    parser.add_argument("--lmstudio-url", default=os.getenv("LMSTUDIO_BASE_URL", "http://localhost:1234/v1"), help="LM Studio base URL")
+    parser.add_argument("--lmstudio-url", default=os.getenv("LMSTUDIO_BASE_URL", "http://localhost:1234/v1"), help="LM Studio base URL. 여러 서버는 쉼표로 구분하며 각 항목은 'URL|모델|가중치' 형식 가능")
     parser.add_argument("--temperature", type=float, default=0.2)
     parser.add_argument("--max-chars", type=int, default=4000, help="청크 최대 문자수")
-    parser.add_argument("--clusters", type=int, default=3, help="클러스터 수")
+    parser.add_argument("--clusters", type=int, default=0, help="클러스터 수 (0이면 실루엣 점수로 자동 선택)")
+    parser.add_argument("--cluster-method", choices=["auto", "exact", "approx"], default="auto", help="클러스터링 방식: 계층적(exact), TruncatedSVD+MiniBatchKMeans(approx), 논문 수에 따라 자동(auto, 2000편 초과 시 approx)")
+    parser.add_argument("--cluster-seed", type=int, default=0, help="클러스터링 난수 시드(재현성)")
+    parser.add_argument("--vectors", choices=["tfidf", "hashing", "embeddings"], default="tfidf", help="보고서 유사도/클러스터에 쓸 논문 벡터: 실행마다 TF-IDF(tfidf), 저장된 해싱 벡터(hashing), LM Studio /embeddings(embeddings). 논문 벡터는 항상 artifacts/vectors에 누적 저장")
+    parser.add_argument("--embedding-model", default="text-embedding-nomic-embed-text-v1.5", help="--vectors embeddings에서 사용할 임베딩 모델명")
+    parser.add_argument("--incremental", action="store_true", help="이전 실행 상태(artifacts/corpus_state.json)를 이용해 바뀐 논문만 유사도/클러스터에 반영하고, 입력이 바뀐 클러스터 종합만 다시 생성 (저장된 벡터 사용)")
+    parser.add_argument("--report-layout", choices=["single", "sharded"], default="single", help="보고서 형식: summary.md 한 파일(single) 또는 index.md + 클러스터별/논문별 페이지(sharded, 바뀐 페이지만 다시 씀)")
+    parser.add_argument("--corpus-synthesis", choices=["auto", "clusters", "single"], default="auto", help="전체 종합 요약 방식: 컨텍스트를 넘으면 클러스터별 요약 후 병합(auto), 항상 클러스터별(clusters), 한 번에(single)")
     parser.add_argument("--max-tokens", type=int, default=512, help="LLM 최대 출력 토큰")
     parser.add_argument(
         "--chunk-summary-words",
         default="120-160",
         help="청크 요약 단어 수(예: '120-160' 또는 '150')",
     )
+    parser.add_argument("--extract-workers", type=int, default=min(4, os.cpu_count() or 1), help="PDF 추출 프로세스 수 (0이면 메인 프로세스에서 순차 추출)")
+    parser.add_argument("--extract-prefetch", type=int, default=None, help="요약보다 앞서 추출해 둘 최대 PDF 수 (기본: 추출 프로세스 수 x2)")
+    parser.add_argument("--max-papers-in-flight", type=int, default=None, help="동시에 요약 대기/진행 중인 최대 논문 수 (기본: 동시 요청 수 x2)")
+    parser.add_argument("--stream-pages-threshold", type=int, default=200, help="이 쪽수 이상인 PDF는 전체 텍스트를 메모리에 올리지 않고 페이지 단위로 읽으며 청크 요약 시작 (0이면 사용 안 함)")
+    parser.add_argument("--clean-text", action=argparse.BooleanOptionalAction, default=True, help="LLM 입력 전 반복 머리말/꼬리말, 쪽번호, 줄바꿈 하이픈 제거")
+    parser.add_argument("--drop-references", action="store_true", help="참고문헌(References) 섹션을 LLM 입력에서 제외")
+    parser.add_argument("--drop-appendix", action="store_true", help="부록(Appendix) 섹션을 LLM 입력에서 제외")
+    parser.add_argument("--force-extract", action="store_true", help="추출 매니페스트를 무시하고 모든 PDF를 다시 추출")
+    parser.add_argument("--min-figure-size", type=int, default=64, help="추출할 그림의 최소 가로/세로 픽셀")
+    parser.add_argument("--min-figure-area", type=int, default=10000, help="추출할 그림의 최소 면적(픽셀)")
+    parser.add_argument("--figures", choices=["all", "representative"], default="all", help="그림 추출 방식: 전체 또는 대표 그림(큰 순 최대 4장)만 디코딩")
+    parser.add_argument("--thumbnails", action=argparse.BooleanOptionalAction, default=True, help="보고서용 축소 JPEG 썸네일 생성(원본은 클릭 시 표시)")
+    parser.add_argument("--thumb-width", type=int, default=480, help="썸네일 최대 가로 픽셀")
+    parser.add_argument("--thumb-workers", type=int, default=2, help="썸네일 생성 프로세스 수")
+    parser.add_argument("--chunking", choices=["chars", "tokens"], default="chars", help="청크 분할 기준: 문자수(--max-chars) 또는 모델 컨텍스트 토큰")
+    parser.add_argument("--chunk-boundaries", choices=["structure", "fixed"], default="structure", help="청크 경계: 섹션/문단/문장 단위 또는 고정 길이(--max-chars 시 200자 겹침)")
+    parser.add_argument("--chunk-overlap-sentences", type=int, default=0, help="구조 단위 청크에서 이전 청크 끝 문장을 이어 붙일 개수(섹션 제목은 항상 포함)")
+    parser.add_argument("--max-llm-calls-per-paper", type=int, default=None, help="예산 모드: 논문당 LLM 호출 상한. BM25로 제목/초록/섹션 단서와 관련 높은 청크만 요약(통합 호출 1회 포함)")
+    parser.add_argument("--combine", choices=["tree", "flat"], default="tree", help="청크 요약 통합 방식: 컨텍스트에 맞게 묶어 단계적으로 병합(tree) 또는 한 번에 통합(flat)")
+    parser.add_argument("--context-length", type=int, default=None, help="모델 컨텍스트 길이(토큰). 미지정 시 서버 /models 메타데이터 사용")
+    parser.add_argument("--tokenizer", default="heuristic", help="토큰 계산 방식: 'heuristic' 또는 'tiktoken[:인코딩]'")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 LLM 요청 수")
+    parser.add_argument("--stream", action="store_true", help="스트리밍(SSE) 응답 사용: 첫 토큰 시간/출력 속도 표시 및 조기 중단")
+    parser.add_argument("--stream-max-chars", type=int, default=None, help="스트리밍 출력 최대 문자수(초과 시 중단)")
+    parser.add_argument("--stream-stall-sec", type=float, default=30.0, help="새 토큰 없이 이 시간(초)이 지나면 스트림 중단")
+    parser.add_argument("--max-rps", type=float, default=None, help="초당 최대 LLM 요청 수")
+    parser.add_argument("--max-tps", type=float, default=None, help="초당 최대 추정 토큰 수(프롬프트+출력)")
+    parser.add_argument("--breaker-threshold", type=int, default=5, help="연속 실패 시 서버를 차단하는 기준 횟수")
+    parser.add_argument("--breaker-cooldown", type=float, default=30.0, help="차단 후 상태 확인까지 대기 시간(초)")
+    parser.add_argument("--cache-backend", choices=["sqlite", "jsonl"], default="sqlite", help="LLM 캐시 저장 방식 (기존 lm_cache.jsonl은 sqlite로 1회 자동 이전)")
+    parser.add_argument("--cache-flush-every", type=int, default=32, help="캐시 쓰기를 모아서 기록할 항목 수")
+    parser.add_argument("--cache-fsync", action="store_true", help="캐시 기록 시 fsync로 디스크 동기화")
     parser.add_argument("--instruction-file", default=None, help="사전 지시 사항 파일 경로 (기본: ./instruction.md 존재 시 자동 사용)")
     parser.add_argument("--interactive", action="store_true", help="실행 전 대화형으로 옵션 수정")
+    parser.add_argument("--progress", choices=["dashboard", "jsonl"], default="dashboard", help="진행 표시: rich 대시보드(dashboard) 또는 이벤트별 JSON 한 줄(jsonl, cron/CI용; 일반 메시지는 stderr로)")
+    parser.add_argument("--progress-file", default=None, help="--progress jsonl 출력 파일 (기본: stdout, 이어쓰기)")
+    parser.add_argument("--dashboard-fps", type=float, default=4.0, help="대시보드 갱신 횟수(초당)")
+    parser.add_argument("--dashboard-rows", type=int, default=10, help="대시보드에 표시할 진행 중/실패 논문 최대 행 수")
 
     args = parser.parse_args(argv)
 
-    console = Console()
+    # Headless mode: stdout carries only the JSON lines
+    progress_log = JsonlProgress(args.progress_file) if args.progress == "jsonl" else None
+    console = Console(stderr=progress_log is not None)
     input_dir = args.input_dir
     artifacts_dir = args.artifacts_dir
     report_dir = args.report_dir
@@ -65,7 +320,8 @@ def main(argv: List[str] = None) -> int:
                 args.temperature = FloatPrompt.ask("Temperature", default=args.temperature)
                 args.max_chars = IntPrompt.ask("청크 최대 문자수", default=args.max_chars)
                 args.max_tokens = IntPrompt.ask("LLM 최대 출력 토큰", default=args.max_tokens)
-                args.clusters = IntPrompt.ask("클러스터 수", default=args.clusters)
+                args.clusters = IntPrompt.ask("클러스터 수 (0: 자동)", default=args.clusters)
+                args.concurrency = IntPrompt.ask("동시 LLM 요청 수", default=args.concurrency)
                 args.chunk_summary_words = Prompt.ask(
                     "청크 요약 단어 수 (예: 120-160 또는 150)",
                     default=str(args.chunk_summary_words),
@@ -78,7 +334,12 @@ def main(argv: List[str] = None) -> int:
     os.makedirs(artifacts_dir, exist_ok=True)
     os.makedirs(report_dir, exist_ok=True)
 
-    cache = JsonlCache(os.path.join(artifacts_dir, "cache"))
+    cache = open_cache(
+        os.path.join(artifacts_dir, "cache"),
+        args.cache_backend,
+        flush_every=args.cache_flush_every,
+        fsync=args.cache_fsync,
+    )
 
     # Load optional instruction.md and pass as pre system message
     pre_messages: List[Dict[str, str]] = []
@@ -99,7 +360,60 @@ def main(argv: List[str] = None) -> int:
         except Exception as e:
             console.print(f"[yellow]instruction.md 읽기 실패:[/yellow] {e}\n")
 
-    client = LMStudioClient(model=args.model, base_url=args.lmstudio_url, cache=cache, pre_messages=pre_messages)
+    client = LMStudioClient(
+        model=args.model,
+        base_url=args.lmstudio_url,
+        cache=cache,
+        pre_messages=pre_messages,
+        pool_size=args.concurrency,
+        stream=args.stream,
+        stream_max_chars=args.stream_max_chars,
+        stream_stall_sec=args.stream_stall_sec,
+        max_requests_per_sec=args.max_rps,
+        max_tokens_per_sec=args.max_tps,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown_sec=args.breaker_cooldown,
+    )
+
+    if len(client.backends) > 1:
+        for url, healthy in client.check_backends().items():
+            state = "[green]정상[/green]" if healthy else "[red]응답 없음[/red]"
+            console.print(f"LM Studio 서버 {url}: {state}")
+    elif not client.health_check():
+        console.print(f"[yellow]LM Studio 서버 {client.backends[0].base_url} 응답 없음: 요약이 실패할 수 있습니다.[/yellow]")
+
+    # Looked up on first use only, so runs that never need it skip the server round trip
+    known_context: List[Optional[int]] = []
+
+    def model_context_length() -> Optional[int]:
+        if not known_context:
+            known_context.append(args.context_length or client.get_context_length())
+        return known_context[0]
+
+    def summaries_token_budget() -> int:
+        # Tokens of summaries per combine/synthesis prompt; 0 (no batching) when the context is unknown
+        length = model_context_length()
+        return combine_token_budget(client, length, args.max_tokens, count_tokens) if length else 0
+
+    # Token-based chunking packs each chunk up to the model's context window
+    context_length: Optional[int] = None
+    count_tokens = get_tokenizer(args.tokenizer)
+    if args.chunking == "tokens":
+        context_length = model_context_length()
+        if context_length:
+            console.print(f"컨텍스트 길이: {context_length} 토큰")
+        else:
+            console.print("[yellow]모델 컨텍스트 길이를 알 수 없어 문자수 기준 청크로 진행합니다 (--context-length 지정 가능).[/yellow]")
+
+    # Budget mode: one call is reserved for the combine step, which a single chunk goes without
+    max_chunks = max(1, args.max_llm_calls_per_paper - 1) if args.max_llm_calls_per_paper else None
+
+    # Tree-reduce batches chunk summaries to fit the combine prompt in the context window
+    combine_budget: Optional[int] = 0
+    if args.combine == "tree":
+        combine_budget = summaries_token_budget()
+        if not combine_budget:
+            console.print("[yellow]모델 컨텍스트 길이를 알 수 없어 청크 요약을 한 번에 통합합니다 (--context-length 지정 가능).[/yellow]")
 
     pdfs = find_pdfs(input_dir)
     if not pdfs:
@@ -117,101 +431,190 @@ def main(argv: List[str] = None) -> int:
             "failed": "[red]×[/red]",
         }.get(status, status)
 
-    tasks: Dict[str, Dict] = {}
-    for pdf_path in pdfs:
-        pid = os.path.splitext(os.path.basename(pdf_path))[0]
-        tasks[pid] = {
-            "paper_path": pdf_path,
-            "title": pid,
-            "extract": "pending",
-            "summarize": "pending",
-            "combine": "pending",
-            "chunks_total": 0,
-            "chunks_done": 0,
-        }
-
-    report_status = "pending"
+    # Shared by worker threads; the dashboard only reads it at its refresh rate
+    progress = ProgressState(
+        [os.path.splitext(os.path.basename(p))[0] for p in pdfs],
+        emit=progress_log,
+    )
 
-    def render_dashboard() -> Panel:
+    def _paper_table(rows: List) -> Table:
         table = Table(box=box.SIMPLE_HEAVY, show_lines=False)
         table.add_column("Paper", overflow="fold")
         table.add_column("Extract", justify="center", width=10)
         table.add_column("Summarize", justify="center", width=12)
         table.add_column("Combine", justify="center", width=10)
-        table.add_column("Chunks", justify="right", width=10)
-        for pid, st in tasks.items():
+        table.add_column("Chunks", justify="right", width=12)
+        if args.clean_text:
+            table.add_column("Saved", justify="right", width=8)
+        if args.stream:
+            table.add_column("Rate", justify="right", width=10)
+        for pid, st in rows:
             name = st.get("title") or pid
             chunks = st.get("chunks_done", 0)
             total = st.get("chunks_total", 0)
-            table.add_row(
+            row = [
                 name,
                 _icon(st["extract"]),
                 _icon(st["summarize"]),
                 _icon(st["combine"]),
-                f"{chunks}/{total}" if total else "-",
-            )
-        footer = f"Report: {_icon(report_status)}  |  총 {len(pdfs)}개 PDF"
-        return Panel(table, title="처리 현황 (TODO)", subtitle=footer, padding=(1,1))
+                (f"{chunks}/{total}" + (f" (-{st['skipped']})" if st.get("skipped") else "")) if total else "-",
+            ]
+            if args.clean_text:
+                saved = st.get("saved")
+                row.append(f"{saved:.0%}" if saved is not None else "-")
+            if args.stream:
+                rate = st.get("rate")
+                row.append(f"{rate:.1f} t/s" if rate else "-")
+            table.add_row(*row)
+        return table
 
-    with Live(render_dashboard(), console=console, refresh_per_second=6) as live:
-        # Process each paper
-        for pdf_path in pdfs:
-            pid = os.path.splitext(os.path.basename(pdf_path))[0]
-            # Update title from metadata after extraction
-            tasks[pid]["extract"] = "in_progress"
-            live.update(render_dashboard())
+    def render_dashboard() -> Panel:
+        # Only counters and the papers in flight or failed: cost doesn't grow with the folder
+        snap = progress.snapshot(max_rows=args.dashboard_rows)
+        parts = [" | ".join(format_counts(snap))]
+        if snap["active"]:
+            parts.append(_paper_table(snap["active"]))
+            if snap["active_count"] > len(snap["active"]):
+                parts.append(f"[dim]… 외 {snap['active_count'] - len(snap['active'])}편 진행 중[/dim]")
+        if snap["failed"]:
+            parts.append("[red]실패[/red]")
+            parts.append(_paper_table(snap["failed"]))
+            if snap["failed_count"] > len(snap["failed"]):
+                parts.append(f"[dim]… 외 {snap['failed_count'] - len(snap['failed'])}편 실패[/dim]")
+        footer = f"Report: {_icon(snap['report'])}  |  총 {snap['total']}개 PDF"
+        return Panel(Group(*parts), title="처리 현황 (TODO)", subtitle=footer, padding=(1,1))
 
-            try:
-                info = extract_pdf(pdf_path, artifacts_dir)
-                title = info["metadata"].get("title") or info["paper_id"]
-                tasks[pid]["title"] = title
-                tasks[pid]["extract"] = "done"
-                live.update(render_dashboard())
-            except Exception as e:
-                tasks[pid]["extract"] = "failed"
-                live.update(render_dashboard())
-                console.print(f"[red]추출 실패[/red] {pdf_path}: {e}")
+    # Thumbnails are encoded in the background while papers are summarized
+    # Spawned like the extraction workers: forking would copy the scheduler threads' locks
+    thumb_pool = (
+        ProcessPoolExecutor(max_workers=max(1, args.thumb_workers), mp_context=multiprocessing.get_context("spawn"))
+        if args.thumbnails
+        else None
+    )
+
+    # The dashboard pulls a snapshot at a fixed rate; progress events never render
+    dashboard = (
+        Live(get_renderable=render_dashboard, console=console, refresh_per_second=args.dashboard_fps)
+        if progress_log is None
+        else nullcontext()
+    )
+    with dashboard, LLMTaskScheduler(
+        concurrency=args.concurrency
+    ) as scheduler:
+        # Extraction runs in a process pool a few papers ahead of summarization;
+        # the in-flight limit stops it from racing through the whole folder
+        def on_extract_start(pdf_path: str) -> None:
+            progress.update(os.path.splitext(os.path.basename(pdf_path))[0], extract="in_progress")
+
+        workers = max(0, args.extract_workers)
+        prefetch = args.extract_prefetch or max(1, workers * 2)
+        in_flight = threading.BoundedSemaphore(args.max_papers_in_flight or max(1, args.concurrency * 2))
+        extract_options = {
+            "min_figure_size": args.min_figure_size,
+            "min_figure_area": args.min_figure_area,
+            "figure_mode": args.figures,
+        }
+        # Unchanged PDFs are loaded from existing artifacts via the manifest
+        manifest = None
+        if not args.force_extract:
+            manifest = ExtractionManifest(artifacts_dir, extractor_fingerprint(extract_options))
+        pending: List[Dict] = []
+        for pdf_path, info, error in iter_extract_pdfs(
+            pdfs,
+            artifacts_dir,
+            workers=workers,
+            prefetch=prefetch,
+            on_start=on_extract_start,
+            manifest=manifest,
+            extract_options=extract_options,
+            stream_pages_threshold=args.stream_pages_threshold or None,
+        ):
+            pid = os.path.splitext(os.path.basename(pdf_path))[0]
+            if error is not None:
+                progress.update(pid, extract="failed", error=str(error))
+                console.print(f"[red]추출 실패[/red] {pdf_path}: {error}")
                 continue
 
-            def on_progress(event: str, data: Dict):
-                st = tasks[pid]
-                if event == "chunking_done":
-                    st["summarize"] = "in_progress"
-                    st["chunks_total"] = int(data.get("chunks") or 0)
-                    st["chunks_done"] = 0
-                elif event == "chunk_summarized":
-                    st["chunks_done"] = min(st.get("chunks_done", 0) + 1, st.get("chunks_total", 0))
-                elif event == "combining":
-                    st["combine"] = "in_progress"
-                elif event == "paper_done":
-                    st["summarize"] = "done"
-                    st["combine"] = "done"
-                live.update(render_dashboard())
+            # Update title from metadata after extraction
+            title = info["metadata"].get("title") or info["paper_id"]
+            progress.update(pid, title=title, extract="done")
 
+            in_flight.acquire()
+            text_stats: Dict = {}
             try:
-                summary = summarize_single_paper(
+                pages = iter_paper_pages(pdf_path, info)
+                if args.clean_text:
+                    pages = clean_pages(
+                        pages,
+                        drop_references=args.drop_references,
+                        drop_appendix=args.drop_appendix,
+                        stats=text_stats,
+                        count_tokens=count_tokens,
+                    )
+                else:
+                    pages = join_pages(pages)
+                future = schedule_paper_summary(
+                    scheduler,
                     client,
-                    paper_text=info["text"],
+                    # Long papers are read page by page while their first chunks are summarized
+                    paper_text=pages,
                     paper_meta=info["metadata"],
                     max_chunk_chars=args.max_chars,
                     temperature=args.temperature,
                     max_output_tokens=args.max_tokens,
-                    on_progress=on_progress,
+                    on_progress=progress.progress_callback(pid),
                     chunk_summary_words=args.chunk_summary_words,
+                    context_length=context_length,
+                    count_tokens=count_tokens,
+                    structured=args.chunk_boundaries == "structure",
+                    overlap_sentences=args.chunk_overlap_sentences,
+                    combine_budget=combine_budget,
+                    max_chunks=max_chunks,
                 )
+            except Exception as e:
+                # Reading or chunking this paper failed: only this paper is lost
+                in_flight.release()
+                progress.update(pid, summarize="failed", error=str(e))
+                future = Future()
+                future.set_exception(e)
+            else:
+                future.add_done_callback(lambda _: in_flight.release())
+            # The text has been fully chunked, so the cleaning stats are final
+            if text_stats.get("tokens_before"):
+                progress.update(pid, saved=1 - text_stats["tokens_after"] / text_stats["tokens_before"])
+            # Chunks now live in the queued tasks; don't keep the full text around
+            info.pop("text", None)
+            thumbs = None
+            if thumb_pool and info["figures_paths"]:
+                reps = select_representative(info["figures_paths"], max_count=4)
+                thumbs = thumb_pool.submit(make_thumbnails, reps, args.thumb_width)
+            pending.append(
+                {"pid": pid, "pdf_path": pdf_path, "info": info, "future": future, "thumbs": thumbs, "text_stats": text_stats}
+            )
+
+        for job in pending:
+            pid, pdf_path, info = job["pid"], job["pdf_path"], job["info"]
+            try:
+                summary = job["future"].result()
                 # If no callbacks fired (e.g., empty text), mark as done appropriately
-                if tasks[pid]["summarize"] == "pending":
-                    tasks[pid]["summarize"] = "done"
-                if tasks[pid]["combine"] == "pending":
-                    tasks[pid]["combine"] = "done"
+                st = progress.papers[pid]
+                unfinished = {stage: "done" for stage in ("summarize", "combine") if st[stage] == "pending"}
+                if unfinished:
+                    progress.update(pid, **unfinished)
             except Exception as e:
                 console.print(f"[red]요약 실패[/red] {pdf_path}: {e}")
-                tasks[pid]["summarize"] = "failed"
-                if tasks[pid]["combine"] == "in_progress":
-                    tasks[pid]["combine"] = "failed"
-                summary = "요약 생성 실패 (LM Studio 서버 동작 여부 확인 필요)"
-            finally:
-                live.update(render_dashboard())
+                failed = {"summarize": "failed", "error": str(e)}
+                if progress.papers[pid]["combine"] == "in_progress":
+                    failed["combine"] = "failed"
+                progress.update(pid, **failed)
+                summary = SUMMARY_FAILED
+
+            thumbnails: Dict[str, str] = {}
+            if job["thumbs"] is not None:
+                try:
+                    thumbnails = job["thumbs"].result()
+                except Exception as e:
+                    console.print(f"[yellow]썸네일 생성 실패[/yellow] {pdf_path}: {e}")
 
             results.append(
                 {
@@ -219,30 +622,126 @@ def main(argv: List[str] = None) -> int:
                     "metadata": info["metadata"],
                     "text_path": info["text_path"],
                     "figures_paths": info["figures_paths"],
+                    "thumbnails": thumbnails,
+                    "text_stats": job["text_stats"],
                     "summary": summary,
                 }
             )
 
+        if thumb_pool:
+            thumb_pool.shutdown()
+
+        tokens_before = sum(r["text_stats"].get("tokens_before", 0) for r in results)
+        if tokens_before:
+            tokens_after = sum(r["text_stats"].get("tokens_after", 0) for r in results)
+            console.print(
+                f"텍스트 정리: LLM 입력 토큰 {tokens_before:,} → {tokens_after:,} "
+                f"({1 - tokens_after / tokens_before:.0%} 절감, 추정치)"
+            )
+
         # Synthesis & Report
-        report_status = "in_progress"
-        live.update(render_dashboard())
+        progress.set_report("in_progress")
+        # The report's clusters double as the map step for large corpora
+        # Paper vectors accumulate under artifacts/vectors for `cli similar`
+        vectors = None
+        vector_kind = "embeddings" if args.vectors == "embeddings" else "hashing"
+        try:
+            index = VectorIndex(artifacts_dir, index_space(vector_kind, args.embedding_model))
+            vectors = paper_vectors(index, results, make_embedder(vector_kind, client, args.embedding_model))
+        except Exception as e:
+            console.print(f"[yellow]논문 벡터 인덱스 갱신 실패:[/yellow] {e}")
+        # With --incremental, clusters stay put and only changed papers are placed
+        state = None
+        if args.incremental and vectors is not None:
+            state = CorpusState(
+                artifacts_dir,
+                {
+                    "vectors": index_space(vector_kind, args.embedding_model),
+                    "clusters": args.clusters,
+                    "cluster_method": args.cluster_method,
+                    "cluster_seed": args.cluster_seed,
+                },
+            )
         try:
-            corpus_summary = synthesize_corpus_summary(
-                client, results, temperature=args.temperature, max_output_tokens=args.max_tokens
+            if state is not None:
+                ids, neighbors, clusters, recomputed = update_similarity_and_clusters(
+                    state,
+                    results,
+                    vectors,
+                    n_clusters=args.clusters,
+                    method=args.cluster_method,
+                    seed=args.cluster_seed,
+                )
+                similarity = (ids, neighbors, clusters)
+                console.print(f"증분 갱신: 유사도/클러스터 {recomputed}/{len(results)}편 재계산")
+            else:
+                similarity = compute_similarity_and_clusters(
+                    results,
+                    n_clusters=args.clusters,
+                    method=args.cluster_method,
+                    seed=args.cluster_seed,
+                    vectors=vectors if args.vectors != "tfidf" else None,
+                )
+        except Exception as e:
+            console.print(f"[yellow]유사도/클러스터 계산 실패:[/yellow] {e}")
+            similarity = None
+        cluster_summaries: Dict[int, str] = {}
+        try:
+            # The corpus synthesis batches paper summaries the same way whatever --combine says
+            synthesis_budget = summaries_token_budget() if args.corpus_synthesis != "single" else 0
+            synthesis_args = dict(
+                token_budget=synthesis_budget or None,
+                temperature=args.temperature,
+                max_output_tokens=args.max_tokens,
+                count_tokens=count_tokens,
+                mode=args.corpus_synthesis,
             )
+            clusters = similarity[2] if similarity else {0: [r["paper_id"] for r in results]}
+            if state is not None and similarity is not None:
+                settings = f"{args.model}|{args.temperature}|{args.max_tokens}|{synthesis_budget}"
+                corpus_summary, cluster_summaries, regenerated = incremental_corpus_synthesis(
+                    state, scheduler, client, results, clusters, settings=settings, **synthesis_args
+                )
+                console.print(f"증분 갱신: 클러스터 종합 {regenerated}개 재생성")
+            else:
+                corpus_summary, cluster_summaries = synthesize_corpus(
+                    scheduler, client, results, clusters, **synthesis_args
+                )
         except Exception as e:
             console.print(f"[red]종합 요약 실패:[/red] {e}")
             corpus_summary = "종합 요약 생성 실패 (LM Studio 서버 동작 여부 확인 필요)"
 
         try:
-            out_path = generate_report(report_dir, corpus_summary, results)
+            if args.report_layout == "sharded":
+                out_path, written, total = generate_sharded_report(
+                    report_dir,
+                    corpus_summary,
+                    results,
+                    similarity=similarity,
+                    cluster_summaries=cluster_summaries,
+                )
+                console.print(f"보고서 페이지 {written}/{total}개 갱신")
+            else:
+                out_path = generate_report(
+                    report_dir,
+                    corpus_summary,
+                    results,
+                    similarity=similarity,
+                    cluster_summaries=cluster_summaries,
+                )
+            if state is not None:
+                state.save()
             console.print(f"[bold green]보고서 생성 완료:[/bold green] {out_path}")
         except Exception as e:
             console.print(f"[red]리포트 생성 실패:[/red] {e}")
         finally:
-            report_status = "done"
-            live.update(render_dashboard())
+            progress.set_report("done")
 
+    client.close()
+    cache.close()
+    if progress_log is not None:
+        progress_log("run_done", None, progress.summary())
+        progress_log.close()
     console.print("완료.")
     return 0
 
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from .report import Neighbors, compute_similarity_and_clusters, top_k_similar
+from .summarize import synthesize_corpus, uses_single_synthesis
+from .text_utils import estimate_tokens
+
+STATE_VERSION = 1
+
+
+def fingerprint(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def paper_fingerprint(item: Dict) -> str:
+    """Changes whenever the paper's summary or title does."""
+    return fingerprint(item["paper_id"], str(item["metadata"].get("title") or ""), item["summary"])
+
+
+def cluster_fingerprint(members: List[str], paper_fps: Dict[str, str]) -> str:
+    """Identity of a cluster's synthesis input: its members and their summaries."""
+    return fingerprint(*(f"{pid}:{paper_fps[pid]}" for pid in sorted(members)))
+
+
+class CorpusState:
+    """Fingerprints and derived results of the previous run (`artifacts/corpus_state.json`).
+
+    Holds, per paper, the summary fingerprint, its cluster and its neighbour
+    list, plus syntheses keyed by the fingerprint of their inputs. The state
+    is discarded when `config` (clustering/vector settings) changes.
+    """
+
+    def __init__(self, artifacts_dir: str, config: Dict) -> None:
+        self.path = os.path.join(artifacts_dir, "corpus_state.json")
+        self.config = config
+        self.papers: Dict[str, Dict] = {}
+        self.syntheses: Dict[str, str] = {}
+        self._used: Set[str] = set()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("version") == STATE_VERSION and data.get("config") == config:
+                self.papers = data.get("papers", {})
+                self.syntheses = data.get("syntheses", {})
+
+    def synthesis(self, fp: str) -> Optional[str]:
+        text = self.syntheses.get(fp)
+        if text is not None:
+            self._used.add(fp)
+        return text
+
+    def store_synthesis(self, fp: str, text: str) -> None:
+        self.syntheses[fp] = text
+        self._used.add(fp)
+
+    def save(self) -> None:
+        # Syntheses nobody asked for this run belong to superseded clusters
+        data = {
+            "version": STATE_VERSION,
+            "config": self.config,
+            "papers": self.papers,
+            "syntheses": {fp: t for fp, t in self.syntheses.items() if fp in self._used},
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def update_similarity_and_clusters(
+    state: CorpusState,
+    items: List[Dict],
+    vectors: np.ndarray,
+    n_clusters: Optional[int] = 3,
+    k: int = 10,
+    method: str = "auto",
+    seed: int = 0,
+    max_drift: float = 0.2,
+) -> Tuple[List[str], Neighbors, Dict[int, List[str]], int]:
+    """`compute_similarity_and_clusters` that only does work for changed papers.
+
+    Papers whose fingerprint matches `state` keep their cluster; new or
+    changed ones join the cluster with the nearest centroid. Neighbour lists
+    are the stored ones merged with similarities to the changed papers; only
+    rows that lost a neighbour are recomputed. Once more than `max_drift` of
+    the corpus changed (or there is no state), everything is refit.
+
+    `vectors` must be stable across runs (stored hashing vectors or
+    embeddings, not a per-run TF-IDF fit). Returns (ids, neighbors,
+    clusters, number of papers recomputed) and updates `state.papers`.
+    """
+    ids = [it["paper_id"] for it in items]
+    pos = {pid: i for i, pid in enumerate(ids)}
+    fps = [paper_fingerprint(it) for it in items]
+    prev = state.papers
+    changed = [i for i, pid in enumerate(ids) if prev.get(pid, {}).get("fp") != fps[i]]
+    removed = [pid for pid in prev if pid not in pos]
+    X = normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(ids)
+
+    if not prev or n < 3 or len(changed) + len(removed) > max_drift * n:
+        ids, neighbors, clusters = compute_similarity_and_clusters(
+            items, n_clusters=n_clusters, k=k, method=method, seed=seed, vectors=X
+        )
+        recomputed = n
+    else:
+        clusters = _assign_clusters(ids, X, changed, prev)
+        neighbors = _update_neighbors(ids, pos, X, changed, removed, prev, k)
+        recomputed = len(changed)
+
+    labels = {pid: cid for cid, members in clusters.items() for pid in members}
+    idx, scores = neighbors
+    state.papers = {
+        pid: {
+            "fp": fps[i],
+            "cluster": labels.get(pid, 0),
+            "neighbors": [[ids[int(j)], float(s)] for j, s in zip(idx[i], scores[i])],
+        }
+        for i, pid in enumerate(ids)
+    }
+    return ids, neighbors, clusters, recomputed
+
+
+def _assign_clusters(ids: List[str], X: np.ndarray, changed: List[int], prev: Dict[str, Dict]) -> Dict[int, List[str]]:
+    dirty = set(changed)
+    labels = {i: int(prev[pid]["cluster"]) for i, pid in enumerate(ids) if i not in dirty}
+    cids = sorted(set(labels.values()))
+    if cids and changed:
+        centroids = normalize(np.stack([
+            X[[i for i, c in labels.items() if c == cid]].mean(axis=0) for cid in cids
+        ]))
+        nearest = np.argmax(X[changed] @ centroids.T, axis=1)
+        for i, c in zip(changed, nearest):
+            labels[i] = cids[int(c)]
+    elif changed:
+        labels.update({i: 0 for i in changed})
+    clusters: Dict[int, List[str]] = {}
+    for i, pid in enumerate(ids):
+        clusters.setdefault(labels[i], []).append(pid)
+    return dict(sorted(clusters.items()))
+
+
+def _update_neighbors(
+    ids: List[str],
+    pos: Dict[str, int],
+    X: np.ndarray,
+    changed: List[int],
+    removed: List[str],
+    prev: Dict[str, Dict],
+    k: int,
+) -> Neighbors:
+    n = len(ids)
+    k = min(k, n - 1)
+    stale = set(removed) | {ids[i] for i in changed}
+    idx = np.zeros((n, k), dtype=np.int64)
+    scores = np.zeros((n, k), dtype=np.float32)
+    dirty = set(changed)
+    # New papers can only enter an unchanged paper's list through these columns
+    sims = X[changed] @ X.T if changed else np.zeros((0, n), dtype=np.float32)
+    for i, pid in enumerate(ids):
+        if i in dirty:
+            continue
+        kept = [(pos[q], s) for q, s in prev[pid].get("neighbors", []) if q in pos and q not in stale]
+        if len(kept) < k:
+            # Lost a neighbour: the replacement could be any paper
+            dirty.add(i)
+            continue
+        kept += [(j, float(sims[r, i])) for r, j in enumerate(changed)]
+        kept.sort(key=lambda t: -t[1])
+        idx[i] = [j for j, _ in kept[:k]]
+        scores[i] = [s for _, s in kept[:k]]
+    if dirty:
+        rows = sorted(dirty)
+        idx[rows], scores[rows] = top_k_similar(X, k, rows=rows)
+    return idx, scores
+
+
+def incremental_corpus_synthesis(
+    state: CorpusState,
+    scheduler,
+    client,
+    paper_summaries: List[Dict],
+    clusters: Dict[int, List[str]],
+    token_budget: Optional[int] = None,
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    mode: str = "auto",
+    settings: str = "",
+) -> Tuple[str, Dict[int, str], int]:
+    """`synthesize_corpus` that reuses syntheses whose inputs are unchanged.
+
+    A cluster synthesis is keyed by its members' fingerprints, the overview
+    by its clusters' (or, on the single-prompt path, all papers'). `settings`
+    (model, temperature, ...) is folded into every key. Returns (overview,
+    cluster syntheses, number of clusters regenerated).
+    """
+    paper_fps = {p["paper_id"]: paper_fingerprint(p) for p in paper_summaries}
+    single = uses_single_synthesis(paper_summaries, token_budget, count_tokens, mode)
+    cluster_fps = {
+        cid: fingerprint(settings, "cluster", cluster_fingerprint(members, paper_fps))
+        for cid, members in clusters.items()
+        if not single and len(members) > 1
+    }
+    if single:
+        overview_fp = fingerprint(settings, "single", *(paper_fps[p["paper_id"]] for p in paper_summaries))
+    else:
+        # Group numbers and titles appear in the overview prompt
+        overview_fp = fingerprint(settings, "overview", *(f"{cid}:{cluster_fingerprint(m, paper_fps)}" for cid, m in clusters.items()))
+
+    cached = {cid: state.synthesis(fp) for cid, fp in cluster_fps.items()}
+    cached = {cid: text for cid, text in cached.items() if text is not None}
+    overview = state.synthesis(overview_fp)
+    if overview is not None and len(cached) == len(cluster_fps):
+        return overview, cached, 0
+
+    overview, cluster_summaries = synthesize_corpus(
+        scheduler,
+        client,
+        paper_summaries,
+        clusters,
+        token_budget=token_budget,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        count_tokens=count_tokens,
+        mode="single" if single else "clusters",
+        cached=cached,
+    )
+    state.store_synthesis(overview_fp, overview)
+    for cid, fp in cluster_fps.items():
+        if cid in cluster_summaries:
+            state.store_synthesis(fp, cluster_summaries[cid])
+    return overview, cluster_summaries, len(cluster_fps) - len(cached)
@@ -1,10 +1,68 @@
+import json
 import os
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from .cache import JsonlCache
+from .cache import Cache
+from .resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay
+
+
+class LMStudioHTTPError(RuntimeError):
+    """Non-OK HTTP response from the LM Studio server."""
+
+    def __init__(self, endpoint: str, status_code: int, retry_after: Optional[float] = None) -> None:
+        super().__init__(f"LMStudio {endpoint} HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, endpoint: str, resp: requests.Response) -> "LMStudioHTTPError":
+        try:
+            retry_after: Optional[float] = float(resp.headers.get("Retry-After", ""))
+        except ValueError:
+            retry_after = None
+        return cls(endpoint, resp.status_code, retry_after)
+
+
+class Backend:
+    """One OpenAI-compatible server in the client's pool.
+
+    `model` overrides the client's model name on this node only; cache keys
+    always use the client's logical model so any node can serve a cached call.
+    """
+
+    def __init__(self, base_url: str, model: Optional[str] = None, weight: float = 1.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.weight = max(0.01, float(weight))
+        # Endpoint ("chat" or "completions") that worked on this node, once known
+        self.endpoint: Optional[str] = None
+        # Serializes calls while the endpoint is unknown so only one probe goes out
+        self.probe_lock = threading.Lock()
+        self.outstanding = 0
+        self.breaker = CircuitBreaker()
+
+    def __repr__(self) -> str:
+        return f"Backend({self.base_url!r}, model={self.model!r}, weight={self.weight})"
+
+
+def parse_backends(spec: str) -> List[Backend]:
+    """Parse `URL[|MODEL[|WEIGHT]]` entries separated by commas."""
+    backends: List[Backend] = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [p.strip() for p in entry.split("|")]
+        model = parts[1] if len(parts) > 1 and parts[1] else None
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        backends.append(Backend(parts[0], model=model, weight=weight))
+    return backends
 
 
 class LMStudioClient:
@@ -13,17 +71,110 @@ class LMStudioClient:
         model: str,
         base_url: Optional[str] = None,
         api_key: Optional[str] = None,
-        cache: Optional[JsonlCache] = None,
+        cache: Optional[Cache] = None,
         timeout: int = 120,
         pre_messages: Optional[List[Dict[str, str]]] = None,
+        pool_size: int = 10,
+        stream: bool = False,
+        stream_max_chars: Optional[int] = None,
+        stream_stall_sec: float = 30.0,
+        max_requests_per_sec: Optional[float] = None,
+        max_tokens_per_sec: Optional[float] = None,
+        breaker_threshold: int = 5,
+        breaker_cooldown_sec: float = 30.0,
+        max_retry_delay_sec: float = 30.0,
+        backends: Optional[List[Backend]] = None,
     ) -> None:
         self.model = model
-        self.base_url = base_url or os.getenv("LMSTUDIO_BASE_URL", "http://localhost:1234/v1")
+        if not backends:
+            url = base_url or os.getenv("LMSTUDIO_BASE_URL", "http://localhost:1234/v1")
+            backends = parse_backends(url)
+        self.backends: List[Backend] = backends
+        self.base_url = self.backends[0].base_url
         self.api_key = api_key or os.getenv("LMSTUDIO_API_KEY", "lm-studio")
         self.cache = cache
         self.timeout = timeout
         # Optional messages to prepend to every request (e.g., instruction.md)
         self.pre_messages: List[Dict[str, str]] = pre_messages or []
+        # Streaming mode: abort once output exceeds `stream_max_chars` or no new
+        # content arrives for `stream_stall_sec`, instead of waiting out `timeout`
+        self.stream = stream
+        self.stream_max_chars = stream_max_chars
+        self.stream_stall_sec = stream_stall_sec
+        # Keep-alive connections shared by every call for the client's lifetime
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self._headers())
+        # Client-side limits on request rate and estimated (prompt + output) tokens/s
+        self._request_bucket = TokenBucket(max_requests_per_sec) if max_requests_per_sec else None
+        self._token_bucket = TokenBucket(max_tokens_per_sec) if max_tokens_per_sec else None
+        # Fail fast while a node is down; GET /models probes it after the cooldown
+        for b in self.backends:
+            b.breaker = CircuitBreaker(
+                breaker_threshold, breaker_cooldown_sec, probe=lambda b=b: self._probe_backend(b)
+            )
+        self.max_retry_delay_sec = max_retry_delay_sec
+        self._route_lock = threading.Lock()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "LMStudioClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def health_check(self) -> bool:
+        """Probe every node; returns True if at least one is healthy."""
+        return any(self.check_backends().values())
+
+    def check_backends(self) -> Dict[str, bool]:
+        status: Dict[str, bool] = {}
+        for b in self.backends:
+            healthy = self._probe_backend(b)
+            if healthy:
+                b.breaker.record_success()
+            else:
+                b.breaker.record_failure()
+            status[b.base_url] = healthy
+        return status
+
+    def _probe_backend(self, backend: Backend) -> bool:
+        try:
+            resp = self.session.get(f"{backend.base_url}/models", timeout=min(5.0, float(self.timeout)))
+            return resp.ok
+        except requests.RequestException:
+            return False
+
+    def get_context_length(self) -> Optional[int]:
+        """Context window of the model from server metadata (smallest across nodes).
+
+        Reads `/models` and, for LM Studio, the richer `/api/v0/models` listing.
+        Returns None when no node reports it.
+        """
+        keys = ("loaded_context_length", "max_context_length", "context_length", "n_ctx")
+        lengths: List[int] = []
+        for b in self.backends:
+            model = b.model or self.model
+            root = b.base_url[: -len("/v1")] if b.base_url.endswith("/v1") else b.base_url
+            for url in (f"{b.base_url}/models", f"{root}/api/v0/models"):
+                try:
+                    resp = self.session.get(url, timeout=min(5.0, float(self.timeout)))
+                    entries = resp.json().get("data", []) if resp.ok else []
+                except (requests.RequestException, ValueError, AttributeError):
+                    continue
+                matches = [e for e in entries if isinstance(e, dict) and e.get("id") == model]
+                if not matches and len(entries) == 1 and isinstance(entries[0], dict):
+                    # Single loaded model served under a different id
+                    matches = entries
+                found = next((int(matches[0][k]) for k in keys if matches and matches[0].get(k)), None)
+                if found:
+                    lengths.append(found)
+                    break
+        return min(lengths) if lengths else None
 
     def _headers(self) -> Dict[str, str]:
         return {
@@ -38,23 +189,26 @@ class LMStudioClient:
         max_tokens: Optional[int] = None,
         retries: int = 3,
         retry_delay_sec: float = 3.0,
+        on_stream: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cache_key: Optional[Dict[str, Any]] = None,
     ) -> str:
         """Call chat/completions with fallback and simple retries.
 
-        - Attempts chat endpoint first; on non-OK, tries completions.
-        - Retries up to `retries` times with `retry_delay_sec` between attempts.
+        - Routes each attempt to the healthy node with the fewest outstanding
+          requests per unit of weight; a node failure fails over to the next one.
+        - Until a node's endpoint is known, attempts chat first; on non-OK, tries
+          completions. The endpoint that answered is used from then on.
+        - Retries up to `retries` times with exponential backoff and jitter
+          (`retry_delay_sec` base, `max_retry_delay_sec` cap).
+        - Raises `CircuitOpenError` immediately while every node is marked down.
+        - With `stream` enabled, chat responses are read as SSE and `on_stream`
+          receives live stats (ttft, tokens, tokens_per_sec) while tokens arrive.
+        - Replies cut short by the stream length budget are not cached.
+        - `cache_key`, if given, replaces the request payload as the cache key,
+          so the reply is stored once under the caller's key.
         """
-        # Merge any pre_messages so that custom system instructions come last among system messages
-        if self.pre_messages:
-            sys_msgs = [m for m in messages if m.get("role") == "system"]
-            other_msgs = [m for m in messages if m.get("role") != "system"]
-            pre_sys = [m for m in self.pre_messages if m.get("role") == "system"]
-            pre_other = [m for m in self.pre_messages if m.get("role") != "system"]
-            merged_messages = sys_msgs + pre_sys + pre_other + other_msgs
-        else:
-            merged_messages = messages
-
-        chat_url = f"{self.base_url.rstrip('/')}/chat/completions"
+        merged_messages = self._merge_messages(messages)
+
         chat_payload: Dict[str, Any] = {
             "model": self.model,
             "messages": merged_messages,
@@ -64,7 +218,10 @@ class LMStudioClient:
             chat_payload["max_tokens"] = max_tokens
 
         if self.cache:
-            cached = self.cache.get({"endpoint": "chat", **chat_payload})
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+            else:
+                cached = self.cache.get({"endpoint": "chat", **chat_payload})
             if cached is not None:
                 return cached
 
@@ -83,7 +240,6 @@ class LMStudioClient:
             lines.append("[Assistant]\n")
             return "\n".join(lines)
 
-        comp_url = f"{self.base_url.rstrip('/')}/completions"
         prompt = _messages_to_prompt(merged_messages)
         comp_payload: Dict[str, Any] = {
             "model": self.model,
@@ -93,52 +249,269 @@ class LMStudioClient:
         if max_tokens is not None:
             comp_payload["max_tokens"] = max_tokens
 
-        if self.cache:
+        if self.cache and cache_key is None:
             cached = self.cache.get({"endpoint": "completions", **comp_payload})
             if cached is not None:
                 return cached
 
+        def _call(backend: Backend) -> Tuple[str, str, bool]:
+            probe = backend.probe_lock if backend.endpoint is None else nullcontext()
+            with probe:
+                return self._attempt(backend, chat_payload, comp_payload, on_stream)
+
+        endpoint, content, complete = self._request(_call, chat_payload, retries, retry_delay_sec)
+        # Budget-truncated streams are returned but never cached
+        if self.cache and complete:
+            if cache_key is not None:
+                self.cache.set(cache_key, content)
+            else:
+                payload = chat_payload if endpoint == "chat" else comp_payload
+                self.cache.set({"endpoint": endpoint, **payload}, content)
+        return content
+
+    def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        batch_size: int = 32,
+        retries: int = 3,
+        retry_delay_sec: float = 3.0,
+    ) -> List[List[float]]:
+        """Embedding vectors for `texts` from the OpenAI-compatible /embeddings endpoint.
+
+        Uses the same routing, rate limits, retries and circuit breakers as
+        `chat_complete`; `model` defaults to the client's model.
+        """
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            batch = texts[start:start + batch_size]
+            payload = {"model": model or self.model, "input": batch}
+
+            def _call(backend: Backend) -> List[List[float]]:
+                resp = self.session.post(f"{backend.base_url}/embeddings", json=payload, timeout=self.timeout)
+                if not resp.ok:
+                    raise LMStudioHTTPError.from_response("embeddings", resp)
+                data = sorted(resp.json()["data"], key=lambda d: d.get("index", 0))
+                if len(data) != len(batch):
+                    raise RuntimeError(f"embeddings: expected {len(batch)} vectors, got {len(data)}")
+                return [d["embedding"] for d in data]
+
+            throttle = {"messages": [{"content": t} for t in batch], "max_tokens": 1}
+            vectors.extend(self._request(_call, throttle, retries, retry_delay_sec))
+        return vectors
+
+    def _request(
+        self,
+        call: Callable[[Backend], Any],
+        throttle_payload: Dict[str, Any],
+        retries: int,
+        retry_delay_sec: float,
+    ) -> Any:
+        """Run `call(backend)` with routing, throttling, breaker bookkeeping and retries.
+
+        `retries` counts rounds: within a round, a node failure fails over to
+        every other healthy node before the round counts as a failed attempt.
+        """
         last_error: Optional[Exception] = None
-        for attempt in range(1, max(1, retries) + 1):
+        failed: Set[Backend] = set()
+        attempts = max(1, retries)
+        attempt = 0
+        while True:
+            backend = self._acquire_backend(failed)
+            failover = False
             try:
-                # Try chat endpoint
-                resp = requests.post(chat_url, json=chat_payload, headers=self._headers(), timeout=self.timeout)
-                if resp.ok:
-                    data = resp.json()
-                    content = data["choices"][0]["message"]["content"].strip()
-                    if self.cache:
-                        self.cache.set({"endpoint": "chat", **chat_payload}, content)
-                    return content
+                self._throttle(throttle_payload)
+                result = call(backend)
             except Exception as e:  # requests errors, JSON decode, etc.
                 last_error = e
+                if self._is_backend_failure(e):
+                    backend.breaker.record_failure()
+                    failed.add(backend)
+                    # Fail over to another healthy node without waiting or using up a retry
+                    failover = self._has_alternative(failed)
+            else:
+                backend.breaker.record_success()
+                return result
+            finally:
+                self._release_backend(backend)
 
-            try:
-                # Fallback to completions
-                comp_resp = requests.post(comp_url, json=comp_payload, headers=self._headers(), timeout=self.timeout)
-                if comp_resp.ok:
-                    comp_data = comp_resp.json()
-                    if "choices" in comp_data and comp_data["choices"]:
-                        choice = comp_data["choices"][0]
-                        content = (choice.get("text") or choice.get("message", {}).get("content") or "").strip()
-                    else:
-                        content = ""
-                    if self.cache:
-                        self.cache.set({"endpoint": "completions", **comp_payload}, content)
-                    return content
-                else:
-                    # Non-OK; remember for potential raise
-                    last_error = RuntimeError(f"LMStudio completions HTTP {comp_resp.status_code}")
-            except Exception as e:
-                last_error = e
-
-            # Retry if not last attempt
-            if attempt < max(1, retries):
-                try:
-                    time.sleep(max(0.0, float(retry_delay_sec)))
-                except Exception:
-                    pass
+            if failover:
+                continue
+            attempt += 1
+            if attempt >= attempts:
+                break
+            delay = backoff_delay(attempt, float(retry_delay_sec), self.max_retry_delay_sec)
+            if isinstance(last_error, LMStudioHTTPError) and last_error.retry_after:
+                delay = max(delay, min(last_error.retry_after, self.max_retry_delay_sec))
+            time.sleep(delay)
+            failed.clear()
 
         # If we reach here, all attempts failed
         if last_error:
             raise last_error
         raise RuntimeError("LMStudio request failed after retries")
+
+    def _merge_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        # Merge any pre_messages so that custom system instructions come last among system messages
+        if not self.pre_messages:
+            return messages
+        sys_msgs = [m for m in messages if m.get("role") == "system"]
+        other_msgs = [m for m in messages if m.get("role") != "system"]
+        pre_sys = [m for m in self.pre_messages if m.get("role") == "system"]
+        pre_other = [m for m in self.pre_messages if m.get("role") != "system"]
+        return sys_msgs + pre_sys + pre_other + other_msgs
+
+    def _iter_sse(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        stats: Dict[str, Any],
+        on_stream: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> Iterator[str]:
+        start = time.monotonic()
+        stats.update({"ttft": None, "tokens": 0, "chars": 0, "tokens_per_sec": 0.0, "truncated": False})
+        # The read timeout bounds the silence between SSE events
+        resp = self.session.post(
+            url,
+            json={**payload, "stream": True},
+            timeout=(min(10.0, float(self.timeout)), self.stream_stall_sec),
+            stream=True,
+        )
+        try:
+            if not resp.ok:
+                raise LMStudioHTTPError.from_response("chat", resp)
+            first_at: Optional[float] = None
+            last_progress = time.monotonic()
+            last_report = 0.0
+            for raw in resp.iter_lines(decode_unicode=False):
+                now = time.monotonic()
+                if now - last_progress > self.stream_stall_sec:
+                    raise RuntimeError(f"LMStudio stream stalled for {self.stream_stall_sec:.0f}s")
+                line = raw.decode("utf-8", errors="replace").strip() if raw else ""
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    choice = json.loads(data)["choices"][0]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                token = (choice.get("delta") or {}).get("content") or choice.get("text") or ""
+                if not token:
+                    continue
+                if first_at is None:
+                    first_at = now
+                    stats["ttft"] = now - start
+                if token.strip():
+                    last_progress = now
+                stats["tokens"] += 1
+                stats["chars"] += len(token)
+                gen_time = now - first_at
+                if gen_time > 0:
+                    stats["tokens_per_sec"] = stats["tokens"] / gen_time
+                yield token
+                if on_stream and now - last_report >= 0.5:
+                    last_report = now
+                    on_stream(dict(stats))
+                if self.stream_max_chars and stats["chars"] >= self.stream_max_chars:
+                    stats["truncated"] = True
+                    break
+        finally:
+            resp.close()
+            stats["elapsed"] = time.monotonic() - start
+            if on_stream:
+                on_stream(dict(stats))
+
+    def _attempt(
+        self,
+        backend: Backend,
+        chat_payload: Dict[str, Any],
+        comp_payload: Dict[str, Any],
+        on_stream: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> Tuple[str, str, bool]:
+        """One try against `backend`; returns (endpoint, content, complete)."""
+        model = backend.model or self.model
+        endpoint = backend.endpoint
+        if endpoint != "completions":
+            url = f"{backend.base_url}/chat/completions"
+            payload = {**chat_payload, "model": model}
+            try:
+                if self.stream:
+                    stats: Dict[str, Any] = {}
+                    content = "".join(self._iter_sse(url, payload, stats, on_stream)).strip()
+                    backend.endpoint = "chat"
+                    return "chat", content, not stats.get("truncated")
+                resp = self.session.post(url, json=payload, timeout=self.timeout)
+                if not resp.ok:
+                    raise LMStudioHTTPError.from_response("chat", resp)
+                data = resp.json()
+                content = data["choices"][0]["message"]["content"].strip()
+                backend.endpoint = "chat"
+                return "chat", content, True
+            except Exception as e:
+                unsupported = isinstance(e, LMStudioHTTPError) and e.status_code in (404, 405, 501)
+                if endpoint == "chat" and unsupported:
+                    # Model/server changed under us; negotiate again next attempt
+                    backend.endpoint = None
+                # Only a server without a chat endpoint falls back (and pins) to completions;
+                # overload, load-time and malformed-reply errors go to the retry path
+                if endpoint == "chat" or not unsupported:
+                    raise
+
+        try:
+            # Fallback to completions
+            comp_resp = self.session.post(
+                f"{backend.base_url}/completions", json={**comp_payload, "model": model}, timeout=self.timeout
+            )
+            if not comp_resp.ok:
+                raise LMStudioHTTPError.from_response("completions", comp_resp)
+            comp_data = comp_resp.json()
+            if "choices" in comp_data and comp_data["choices"]:
+                choice = comp_data["choices"][0]
+                content = (choice.get("text") or choice.get("message", {}).get("content") or "").strip()
+            else:
+                content = ""
+            backend.endpoint = "completions"
+            return "completions", content, True
+        except Exception as e:
+            if endpoint == "completions" and isinstance(e, LMStudioHTTPError) and e.status_code in (404, 405, 501):
+                backend.endpoint = None
+            raise
+
+    def _acquire_backend(self, exclude: Set[Backend]) -> Backend:
+        """Pick the least-loaded admissible node (outstanding requests / weight)."""
+        with self._route_lock:
+            pool = [b for b in self.backends if b not in exclude] or list(self.backends)
+            ranked = sorted(pool, key=lambda b: (b.breaker.is_open, (b.outstanding + 1) / b.weight))
+        for b in ranked:
+            try:
+                b.breaker.before_call()
+            except CircuitOpenError:
+                continue
+            with self._route_lock:
+                b.outstanding += 1
+            return b
+        raise CircuitOpenError("all LMStudio backends unavailable (circuit open)")
+
+    def _release_backend(self, backend: Backend) -> None:
+        with self._route_lock:
+            backend.outstanding -= 1
+
+    def _has_alternative(self, failed: Set[Backend]) -> bool:
+        return any(b not in failed and not b.breaker.is_open for b in self.backends)
+
+    def _throttle(self, chat_payload: Dict[str, Any]) -> None:
+        if self._request_bucket:
+            self._request_bucket.acquire(1)
+        if self._token_bucket:
+            # Rough estimate: ~4 characters per prompt token plus the output budget
+            prompt_chars = sum(len(m.get("content", "")) for m in chat_payload.get("messages", []))
+            self._token_bucket.acquire(prompt_chars / 4 + (chat_payload.get("max_tokens") or 256))
+
+    @staticmethod
+    def _is_backend_failure(err: Exception) -> bool:
+        """Whether `err` says the server is unhealthy (vs. rejecting this request)."""
+        if isinstance(err, LMStudioHTTPError):
+            return err.status_code >= 500 or err.status_code == 429
+        return isinstance(err, requests.RequestException)
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionManifest:
+    """Record of extracted PDFs under `artifacts/manifest.json`.
+
+    Each source PDF maps to its size, mtime, content hash, the extractor
+    version that produced its artifacts and the artifact paths. A PDF whose
+    size and mtime (or, if only the mtime moved, content hash) still match
+    can be loaded from the existing artifacts without opening it.
+    """
+
+    def __init__(self, artifacts_dir: str, extractor_version: str) -> None:
+        self.path = os.path.join(artifacts_dir, "manifest.json")
+        self.extractor_version = extractor_version
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def lookup(self, pdf_path: str, with_text: bool = True) -> Optional[Dict]:
+        """Return the stored extraction result for an unchanged PDF, else None.
+
+        With `with_text=False` the text is left on disk and "text" is None.
+        """
+        key = os.path.abspath(pdf_path)
+        entry = self.entries.get(key)
+        if not entry or entry.get("extractor_version") != self.extractor_version:
+            return None
+        try:
+            st = os.stat(pdf_path)
+        except OSError:
+            return None
+        if st.st_size != entry.get("size"):
+            return None
+        if st.st_mtime != entry.get("mtime"):
+            # Touched but maybe not modified: fall back to the content hash
+            if file_sha256(pdf_path) != entry.get("sha256"):
+                return None
+            with self._lock:
+                entry["mtime"] = st.st_mtime
+                self._dirty = True
+
+        info = entry.get("info") or {}
+        text_path = info.get("text_path")
+        metadata_path = info.get("metadata_path")
+        figures = info.get("figures_paths") or []
+        if not (text_path and metadata_path and os.path.exists(text_path) and os.path.exists(metadata_path)):
+            return None
+        if not all(os.path.exists(p) for p in figures):
+            return None
+        try:
+            text = None
+            if with_text:
+                with open(text_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return {**info, "metadata": metadata, "text": text}
+
+    def record(self, pdf_path: str, info: Dict) -> None:
+        st = os.stat(pdf_path)
+        entry = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha256": file_sha256(pdf_path),
+            "extractor_version": self.extractor_version,
+            "info": {k: v for k, v in info.items() if k not in ("text", "metadata")},
+        }
+        with self._lock:
+            self.entries[os.path.abspath(pdf_path)] = entry
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": self.entries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+            self._dirty = False
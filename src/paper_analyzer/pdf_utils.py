@@ -1,10 +1,27 @@
 import os
+import hashlib
 import json
+import multiprocessing
 import re
-from typing import Dict, List, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 
+from .manifest import ExtractionManifest
+
+# Bump whenever extract_pdf output changes so the manifest re-extracts
+EXTRACTOR_VERSION = "3"
+
+# Separates pages in the saved text so later stages can work per page
+PAGE_BREAK = "\f"
+
+
+def extractor_fingerprint(options: Optional[Dict] = None) -> str:
+    """Manifest version string: extractor version plus the extraction options."""
+    return f"{EXTRACTOR_VERSION}:{json.dumps(options or {}, sort_keys=True)}"
+
 
 def slugify(value: str) -> str:
     value = value.strip().lower()
@@ -20,11 +37,26 @@ def ensure_dir(path: str) -> None:
 def extract_pdf(
     pdf_path: str,
     artifacts_dir: str,
+    min_figure_size: int = 64,
+    min_figure_area: int = 10000,
+    figure_mode: str = "all",
+    max_figures: int = 4,
+    stream_pages_threshold: Optional[int] = None,
 ) -> Dict:
     """
     Extract text, figures, and metadata from a PDF.
 
-    Returns dict with keys: paper_id, text_path, figures_paths, metadata_path, metadata
+    Figures are deduplicated by xref and by pixel hash, and images narrower or
+    shorter than `min_figure_size` px or smaller than `min_figure_area` px are
+    skipped using the image metadata, before any decoding. With
+    `figure_mode="representative"` only the `max_figures` largest images are
+    decoded and saved.
+
+    Documents with at least `stream_pages_threshold` pages get no text here
+    ("text" is None); read it page by page with `iter_paper_pages` instead.
+    Pages are separated by `PAGE_BREAK` in the text.
+
+    Returns dict with keys: paper_id, text_path, figures_paths, metadata_path, metadata, text
     """
     filename = os.path.splitext(os.path.basename(pdf_path))[0]
     paper_id = slugify(filename)
@@ -43,17 +75,15 @@ def extract_pdf(
     doc = fitz.open(pdf_path)
 
     # Text extraction
-    texts: List[str] = []
-    for page in doc:
-        try:
-            texts.append(page.get_text("text"))
-        except Exception:
-            # fallback to simple text
-            texts.append(page.get_text())
-    full_text = "\n".join(texts)
-
-    with open(text_path, "w", encoding="utf-8") as f:
-        f.write(full_text)
+    full_text: Optional[str] = None
+    if stream_pages_threshold and len(doc) >= stream_pages_threshold:
+        # Streamed later; a stale file must not pass for this extraction's text
+        if os.path.exists(text_path):
+            os.remove(text_path)
+    else:
+        full_text = PAGE_BREAK.join(_iter_page_texts(doc))
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(full_text)
 
     # Metadata extraction
     meta = doc.metadata or {}
@@ -72,9 +102,9 @@ def extract_pdf(
     with open(metadata_path, "w", encoding="utf-8") as f:
         json.dump(meta_obj, f, ensure_ascii=False, indent=2)
 
-    # Image extraction
-    fig_paths: List[str] = []
-    img_index = 0
+    # Image extraction: choose candidates from metadata, decode only those
+    candidates: List[Tuple[int, int, int]] = []  # (position, xref, area)
+    seen_xrefs = set()
     for page_index in range(len(doc)):
         page = doc[page_index]
         try:
@@ -82,19 +112,58 @@ def extract_pdf(
         except Exception:
             images = []
         for img in images:
-            xref = img[0]
-            try:
-                pix = fitz.Pixmap(doc, xref)
-                # If CMYK convert to RGB
-                if pix.n >= 5:
-                    pix = fitz.Pixmap(fitz.csRGB, pix)
-                img_path = os.path.join(figures_dir, f"img_{img_index:03d}.png")
-                pix.save(img_path)
-                fig_paths.append(img_path)
-                img_index += 1
-            except Exception:
-                # skip problematic images
+            xref, width, height = img[0], img[2], img[3]
+            if xref in seen_xrefs:
                 continue
+            seen_xrefs.add(xref)
+            if min(width, height) < min_figure_size or width * height < min_figure_area:
+                continue
+            candidates.append((len(candidates), xref, width * height))
+    limit = len(candidates)
+    if figure_mode == "representative":
+        # Largest first; the pixel-hash dedup below may consume a few extras
+        candidates.sort(key=lambda c: c[2], reverse=True)
+        limit = max_figures
+
+    # Drop figures left over from an earlier extraction of this paper
+    for name in os.listdir(figures_dir):
+        if name.startswith("img_"):
+            os.remove(os.path.join(figures_dir, name))
+
+    fig_paths: List[str] = []
+
+    def _save(pix: "fitz.Pixmap") -> None:
+        img_path = os.path.join(figures_dir, f"img_{len(fig_paths):03d}.png")
+        pix.save(img_path)
+        fig_paths.append(img_path)
+
+    # Representative picks are held back so they can be saved in document order
+    picked: List[Tuple[int, "fitz.Pixmap"]] = []
+    seen_pixels = set()
+    for position, xref, _ in candidates:
+        if len(picked) + len(fig_paths) >= limit:
+            break
+        try:
+            pix = fitz.Pixmap(doc, xref)
+            digest = hashlib.sha1(pix.samples).hexdigest() + f":{pix.width}x{pix.height}"
+            if digest in seen_pixels:
+                continue
+            seen_pixels.add(digest)
+            # If CMYK convert to RGB
+            if pix.n >= 5:
+                pix = fitz.Pixmap(fitz.csRGB, pix)
+            if figure_mode == "representative":
+                picked.append((position, pix))
+            else:
+                _save(pix)
+        except Exception:
+            # skip problematic images
+            continue
+    for _, pix in sorted(picked, key=lambda p: p[0]):
+        try:
+            _save(pix)
+        except Exception:
+            continue
 
     doc.close()
 
@@ -107,3 +176,169 @@ def extract_pdf(
         "text": full_text,
     }
 
+
+def _iter_page_texts(doc: "fitz.Document") -> Iterator[str]:
+    for page in doc:
+        try:
+            yield page.get_text("text")
+        except Exception:
+            # fallback to simple text
+            yield page.get_text()
+
+
+def iter_pdf_text(pdf_path: str, text_path: str) -> Iterator[str]:
+    """Yield a PDF's pages one at a time, writing them to `text_path` on the way.
+
+    The file only appears once every page has been read, so an interrupted
+    run never leaves a truncated text behind.
+    """
+    tmp = text_path + ".part"
+    doc = fitz.open(pdf_path)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i, text in enumerate(_iter_page_texts(doc)):
+                f.write(text if i == 0 else PAGE_BREAK + text)
+                yield text
+        os.replace(tmp, text_path)
+    finally:
+        doc.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def iter_paper_pages(pdf_path: str, info: Dict, block_chars: int = 1 << 16) -> Iterator[str]:
+    """Page texts of an extracted paper, without holding the whole text.
+
+    Uses the in-memory text when extraction kept it, else the saved text file,
+    else reads the PDF itself (see `iter_pdf_text`).
+    """
+    if info.get("text") is not None:
+        yield from info["text"].split(PAGE_BREAK)
+        return
+    text_path = info["text_path"]
+    if not os.path.exists(text_path):
+        yield from iter_pdf_text(pdf_path, text_path)
+        return
+    with open(text_path, "r", encoding="utf-8") as f:
+        rest = ""
+        for block in iter(lambda: f.read(block_chars), ""):
+            *pages, rest = (rest + block).split(PAGE_BREAK)
+            yield from pages
+        yield rest
+
+
+def join_pages(pages: Iterable[str]) -> Iterator[str]:
+    """Stream pages as plain text, one newline between pages."""
+    for i, text in enumerate(pages):
+        yield text if i == 0 else "\n" + text
+
+
+def iter_extract_pdfs(
+    pdf_paths: Iterable[str],
+    artifacts_dir: str,
+    workers: int = 4,
+    prefetch: int = 8,
+    on_start: Optional[Callable[[str], None]] = None,
+    manifest: Optional[ExtractionManifest] = None,
+    extract_options: Optional[Dict] = None,
+    stream_pages_threshold: Optional[int] = None,
+) -> Iterator[Tuple[str, Optional[Dict], Optional[BaseException]]]:
+    """Extract PDFs in a process pool, yielding (pdf_path, info, error) in input order.
+
+    At most `prefetch` extractions are submitted ahead of the consumer, so a
+    slow consumer (e.g. one waiting for LLM capacity) applies backpressure and
+    memory stays bounded. `workers=0` extracts inline in the calling process.
+    With a `manifest`, unchanged PDFs are loaded from their existing artifacts
+    and fresh extractions are recorded (saved when the iterator finishes).
+    `extract_options` are passed to `extract_pdf` as keyword arguments.
+    Papers with at least `stream_pages_threshold` pages come back without
+    "text" so the caller can stream it with `iter_paper_pages`.
+    """
+    paths = iter(pdf_paths)
+    options = dict(extract_options or {}, stream_pages_threshold=stream_pages_threshold)
+    try:
+        yield from _iter_extract(paths, artifacts_dir, workers, prefetch, on_start, manifest, options)
+    finally:
+        if manifest:
+            manifest.save()
+
+
+def _iter_extract(
+    paths: Iterator[str],
+    artifacts_dir: str,
+    workers: int,
+    prefetch: int,
+    on_start: Optional[Callable[[str], None]],
+    manifest: Optional[ExtractionManifest],
+    options: Dict,
+) -> Iterator[Tuple[str, Optional[Dict], Optional[BaseException]]]:
+    threshold = options.get("stream_pages_threshold")
+
+    def _cached(pdf_path: str) -> Optional[Dict]:
+        info = manifest.lookup(pdf_path, with_text=False) if manifest else None
+        if info is None:
+            return None
+        if threshold and (info["metadata"].get("page_count") or 0) >= threshold:
+            return info
+        try:
+            with open(info["text_path"], "r", encoding="utf-8") as f:
+                info["text"] = f.read()
+        except OSError:
+            return None
+        return info
+
+    def _record(pdf_path: str, info: Dict) -> None:
+        if manifest:
+            try:
+                manifest.record(pdf_path, info)
+            except OSError:
+                pass
+
+    if workers <= 0:
+        for pdf_path in paths:
+            if on_start:
+                on_start(pdf_path)
+            info = _cached(pdf_path)
+            if info is not None:
+                yield pdf_path, info, None
+                continue
+            try:
+                info = extract_pdf(pdf_path, artifacts_dir, **options)
+            except Exception as e:
+                yield pdf_path, None, e
+                continue
+            _record(pdf_path, info)
+            yield pdf_path, info, None
+        return
+
+    window: Deque[Tuple[str, Future]] = deque()
+    # Spawned, not forked: the caller already runs scheduler threads whose locks a fork would copy
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+
+        def _fill() -> None:
+            while len(window) < max(1, prefetch):
+                pdf_path = next(paths, None)
+                if pdf_path is None:
+                    return
+                if on_start:
+                    on_start(pdf_path)
+                info = _cached(pdf_path)
+                if info is not None:
+                    done: Future = Future()
+                    done.set_result(info)
+                    window.append((pdf_path, done))
+                    continue
+                fut = pool.submit(extract_pdf, pdf_path, artifacts_dir, **options)
+                fut.add_done_callback(lambda f, p=pdf_path: None if f.exception() else _record(p, f.result()))
+                window.append((pdf_path, fut))
+
+        _fill()
+        while window:
+            pdf_path, fut = window.popleft()
+            try:
+                info, error = fut.result(), None
+            except Exception as e:
+                info, error = None, e
+            # Top up the window before handing the result over
+            _fill()
+            yield pdf_path, info, error
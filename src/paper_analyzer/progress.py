@@ -0,0 +1,164 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+STAGES = ("extract", "summarize", "combine")
+
+# event, paper id (None for run-level events), fields
+EmitFn = Callable[[str, Optional[str], Dict], None]
+
+
+class ProgressState:
+    """Per-paper pipeline status shared by the main and worker threads.
+
+    Writers call `update`, `set_report` or a `progress_callback`; aggregate
+    counters and the set of active/failed papers are maintained as statuses
+    change, so readers never scan every paper. The dashboard reads a
+    `snapshot` at its own refresh rate; every change is also passed to
+    `emit` (e.g. a `JsonlProgress`) if given.
+    """
+
+    def __init__(self, paper_ids: Iterable[str], emit: Optional[EmitFn] = None) -> None:
+        self._lock = threading.Lock()
+        self._emit = emit
+        self.papers: Dict[str, Dict] = {}
+        for pid in paper_ids:
+            self.papers[pid] = {
+                "title": pid,
+                "extract": "pending",
+                "summarize": "pending",
+                "combine": "pending",
+                "chunks_total": 0,
+                "chunks_done": 0,
+                "rate": None,
+                "saved": None,
+                "skipped": 0,
+            }
+        self.counts: Counter = Counter({f"{stage}:pending": len(self.papers) for stage in STAGES})
+        self.chunks_total = 0
+        self.chunks_done = 0
+        # Insertion-ordered sets
+        self.active: Dict[str, None] = {}
+        self.failed: Dict[str, None] = {}
+        self.report = "pending"
+        self.started = time.monotonic()
+
+    def update(self, pid: str, **fields) -> None:
+        with self._lock:
+            self._apply(pid, fields)
+        if self._emit:
+            self._emit("status", pid, fields)
+
+    def _apply(self, pid: str, fields: Dict) -> None:
+        st = self.papers[pid]
+        for key, value in fields.items():
+            if key in STAGES and st[key] != value:
+                self.counts[f"{key}:{st[key]}"] -= 1
+                self.counts[f"{key}:{value}"] += 1
+            elif key == "chunks_total":
+                self.chunks_total += value - st[key]
+            elif key == "chunks_done":
+                self.chunks_done += value - st[key]
+            st[key] = value
+        statuses = [st[stage] for stage in STAGES]
+        if "failed" in statuses:
+            self.active.pop(pid, None)
+            self.failed[pid] = None
+        elif "in_progress" in statuses or (st["extract"] == "done" and st["combine"] != "done"):
+            self.active[pid] = None
+        else:
+            self.active.pop(pid, None)
+
+    def set_report(self, status: str) -> None:
+        with self._lock:
+            self.report = status
+        if self._emit:
+            self._emit("report", None, {"status": status})
+
+    def progress_callback(self, pid: str) -> Callable[[str, Dict], None]:
+        """`on_progress` for `schedule_paper_summary` (called from scheduler threads)."""
+
+        def on_progress(event: str, data: Dict) -> None:
+            with self._lock:
+                st = self.papers[pid]
+                if event == "chunking_done":
+                    self._apply(pid, {"summarize": "in_progress", "chunks_total": int(data.get("chunks") or 0)})
+                elif event == "chunk_queued":
+                    # Streamed text: the total grows until chunking_done
+                    self._apply(pid, {"summarize": "in_progress", "chunks_total": int(data.get("i") or 0)})
+                elif event == "chunk_summarized":
+                    self._apply(pid, {"chunks_done": min(st["chunks_done"] + 1, st["chunks_total"])})
+                elif event == "chunks_skipped":
+                    self._apply(pid, {"skipped": int(data.get("skipped") or 0)})
+                elif event == "combining":
+                    self._apply(pid, {"combine": "in_progress"})
+                elif event == "paper_done":
+                    self._apply(pid, {"summarize": "done", "combine": "done"})
+                elif event == "stream_stats":
+                    self._apply(pid, {"rate": data.get("tokens_per_sec") or st["rate"]})
+            if self._emit:
+                self._emit(event, pid, data)
+
+        return on_progress
+
+    def snapshot(self, max_rows: int = 10) -> Dict:
+        """Counters plus copies of up to `max_rows` active and failed papers."""
+        with self._lock:
+            return {
+                "total": len(self.papers),
+                "counts": {k: v for k, v in self.counts.items() if v},
+                "chunks_total": self.chunks_total,
+                "chunks_done": self.chunks_done,
+                "active": [(pid, dict(self.papers[pid])) for pid in list(self.active)[:max_rows]],
+                "active_count": len(self.active),
+                "failed": [(pid, dict(self.papers[pid])) for pid in list(self.failed)[:max_rows]],
+                "failed_count": len(self.failed),
+                "report": self.report,
+                "elapsed": time.monotonic() - self.started,
+            }
+
+    def summary(self) -> Dict:
+        snap = self.snapshot(max_rows=0)
+        return {k: snap[k] for k in ("total", "counts", "chunks_total", "chunks_done", "failed_count", "elapsed")}
+
+
+class JsonlProgress:
+    """Writes progress events as JSON lines to a file (appended) or stdout."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._lock = threading.Lock()
+        self._owned = bool(path and path != "-")
+        self._out = open(path, "a", encoding="utf-8") if self._owned else sys.stdout
+
+    def __call__(self, event: str, paper_id: Optional[str], data: Dict) -> None:
+        record = {"ts": round(time.time(), 3), "event": event}
+        if paper_id is not None:
+            record["paper_id"] = paper_id
+        record.update(data)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()
+
+    def close(self) -> None:
+        if self._owned:
+            self._out.close()
+
+
+def format_counts(snap: Dict) -> List[str]:
+    """One-line aggregate figures for the dashboard header."""
+    c = snap["counts"]
+    done = c.get("summarize:done", 0)
+    elapsed = snap["elapsed"]
+    rate = done / elapsed * 60 if elapsed > 0 else 0.0
+    minutes, seconds = divmod(int(elapsed), 60)
+    return [
+        f"PDF {snap['total']}",
+        f"추출 {c.get('extract:done', 0)}",
+        f"요약 완료 {done} · 진행 {snap['active_count']} · 실패 {snap['failed_count']}",
+        f"청크 {snap['chunks_done']}/{snap['chunks_total']}",
+        f"{minutes}:{seconds:02d} 경과 · {rate:.1f}편/분",
+    ]
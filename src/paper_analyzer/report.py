@@ -1,50 +1,184 @@
+import hashlib
+import json
+import math
 import os
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import normalize
 
+# (indexes, cosine scores) of each paper's nearest neighbours, both shaped (n, k)
+Neighbors = Tuple[np.ndarray, np.ndarray]
 
-def compute_similarity_and_clusters(items: List[Dict], n_clusters: int = 3):
+# Dense similarity block size (rows x papers) kept under ~64 MB of float32
+_BLOCK_ELEMENTS = 1 << 24
+
+
+def top_k_similar(X, k: int = 10, rows: Optional[List[int]] = None) -> Neighbors:
+    """Top-`k` cosine neighbours of every row of an L2-normalized (sparse or dense) matrix.
+
+    Similarities are computed a block of rows at a time as sparse products
+    and reduced with argpartition, so memory stays O(n*k) plus one block.
+    With `rows`, only those rows' neighbours are computed (in that order).
+    """
+    n = X.shape[0]
+    rows = list(range(n)) if rows is None else list(rows)
+    k = min(k, n - 1)
+    idx = np.zeros((len(rows), max(k, 0)), dtype=np.int64)
+    scores = np.zeros((len(rows), max(k, 0)), dtype=np.float32)
+    if k <= 0 or not rows:
+        return idx, scores
+    Xt = X.T.tocsr() if sparse.issparse(X) else np.ascontiguousarray(X.T)
+    block = max(1, _BLOCK_ELEMENTS // n)
+    for start in range(0, len(rows), block):
+        chunk = rows[start:start + block]
+        sims = X[chunk] @ Xt
+        sims = sims.toarray() if sparse.issparse(sims) else np.array(sims, dtype=np.float32)
+        sims[np.arange(len(chunk)), chunk] = -np.inf  # not its own neighbour
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        idx[start:start + len(chunk)] = np.take_along_axis(part, order, axis=1)
+        scores[start:start + len(chunk)] = np.take_along_axis(part_scores, order, axis=1)
+    return idx, scores
+
+
+def _reduce_dims(X, seed: int = 0, max_components: int = 100) -> np.ndarray:
+    """TruncatedSVD (LSA) projection of sparse TF-IDF rows, re-normalized for cosine geometry."""
+    if not sparse.issparse(X) and X.shape[1] <= max_components:
+        # Already compact (stored paper vectors)
+        return normalize(X)
+    n_components = min(max_components, X.shape[0] - 1, X.shape[1] - 1)
+    if n_components < 2:
+        return normalize(X.toarray() if sparse.issparse(X) else X)
+    Z = TruncatedSVD(n_components=n_components, random_state=seed).fit_transform(X)
+    return normalize(Z)
+
+
+def choose_cluster_count(Z: np.ndarray, max_k: Optional[int] = None, seed: int = 0, sample_size: int = 2000) -> int:
+    """Cluster count with the best silhouette score for MiniBatchKMeans on `Z`.
+
+    Candidates run from 2 to about sqrt(n) (at most 30); the score is
+    computed on a fixed-seed sample so the choice stays cheap and repeatable.
+    """
+    n = Z.shape[0]
+    if n < 3:
+        return 1
+    max_k = max_k or min(30, max(2, int(math.sqrt(n))))
+    best_k, best_score = 2, -1.0
+    for k in range(2, min(max_k, n - 1) + 1):
+        labels = MiniBatchKMeans(n_clusters=k, random_state=seed, n_init=3, batch_size=1024).fit_predict(Z)
+        if len(set(labels)) < 2:
+            continue
+        score = silhouette_score(Z, labels, sample_size=min(n, sample_size), random_state=seed)
+        if score > best_score:
+            best_k, best_score = k, score
+    return best_k
+
+
+def cluster_vectors(
+    X,
+    n_clusters: Optional[int] = 3,
+    method: str = "auto",
+    seed: int = 0,
+    exact_max: int = 2000,
+) -> np.ndarray:
+    """Cluster labels for sparse TF-IDF rows.
+
+    "exact" is average-linkage agglomerative clustering on the dense matrix
+    (quadratic memory); "approx" is TruncatedSVD + MiniBatchKMeans, linear in
+    the corpus size. "auto" uses exact up to `exact_max` papers. A falsy
+    `n_clusters` picks the count by silhouette score. Results are
+    reproducible for a given `seed`.
+    """
+    n = X.shape[0]
+    if method == "auto":
+        method = "exact" if n <= exact_max else "approx"
+    Z = None
+    if not n_clusters:
+        Z = _reduce_dims(X, seed)
+        n_clusters = choose_cluster_count(Z, seed=seed)
+    n_clusters = max(1, min(n_clusters, n))
+    if n_clusters == 1:
+        return np.zeros(n, dtype=np.int64)
+    if method == "exact":
+        clustering = AgglomerativeClustering(n_clusters=n_clusters, metric="cosine", linkage="average")
+        return clustering.fit_predict(X.toarray() if sparse.issparse(X) else X)
+    if Z is None:
+        Z = _reduce_dims(X, seed)
+    return MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3, batch_size=1024).fit_predict(Z)
+
+
+def compute_similarity_and_clusters(
+    items: List[Dict],
+    n_clusters: Optional[int] = 3,
+    k: int = 10,
+    method: str = "auto",
+    seed: int = 0,
+    vectors: Optional[np.ndarray] = None,
+):
+    """Return (ids, neighbors, clusters); neighbors are sparse top-`k` similarities.
+
+    Summaries are vectorized with TF-IDF unless normalized `vectors` (one row
+    per item, e.g. from a `VectorIndex`) are given. See `cluster_vectors` for
+    `n_clusters`, `method` and `seed`.
+    """
     texts = [it["summary"] for it in items]
     ids = [it["paper_id"] for it in items]
     if len(texts) == 0:
-        return ids, np.zeros((0, 0)), {}
+        return ids, top_k_similar(np.zeros((0, 0)), k), {}
     if len(texts) == 1:
-        return ids, np.array([[1.0]]), {0: [ids[0]]}
-
-    vec = TfidfVectorizer(max_features=5000, ngram_range=(1, 2))
-    X = vec.fit_transform(texts)
-    sim = cosine_similarity(X)
+        return ids, top_k_similar(np.zeros((1, 0)), k), {0: [ids[0]]}
 
-    n_clusters = min(n_clusters, len(items))
-    clustering = AgglomerativeClustering(n_clusters=n_clusters, metric="cosine", linkage="average")
-    labels = clustering.fit_predict(X.toarray())
+    if vectors is not None:
+        X = np.asarray(vectors, dtype=np.float32)
+    else:
+        vec = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), dtype=np.float32)
+        X = vec.fit_transform(texts)
+    neighbors = top_k_similar(X, k)
+    labels = cluster_vectors(X, n_clusters=n_clusters, method=method, seed=seed)
 
     clusters: Dict[int, List[str]] = {}
     for pid, lab in zip(ids, labels):
         clusters.setdefault(int(lab), []).append(pid)
-    return ids, sim, clusters
-
-
-def render_similarity_table(ids: List[str], sim) -> str:
-    # top pairs
-    pairs = []
-    n = len(ids)
-    for i in range(n):
-        for j in range(i + 1, n):
-            pairs.append((ids[i], ids[j], float(sim[i, j])))
-    pairs.sort(key=lambda x: x[2], reverse=True)
-    pairs = pairs[: min(10, len(pairs))]
+    return ids, neighbors, clusters
+
+
+def top_pairs(neighbors: Neighbors, limit: int = 10) -> List[Tuple[int, int, float]]:
+    """Most similar distinct pairs (i < j) from the neighbour lists.
+
+    Exact for `limit` <= k: a pair among the global top `limit` is always in
+    both papers' top-k lists.
+    """
+    idx, scores = neighbors
+    n, k = idx.shape
+    if n == 0 or k == 0:
+        return []
+    rows = np.repeat(np.arange(n), k)
+    cols = idx.ravel()
+    a, b = np.minimum(rows, cols), np.maximum(rows, cols)
+    keys, first = np.unique(a * n + b, return_index=True)
+    pair_scores = scores.ravel()[first]
+    limit = min(limit, len(keys))
+    best = np.argpartition(-pair_scores, limit - 1)[:limit]
+    best = best[np.argsort(-pair_scores[best], kind="stable")]
+    return [(int(keys[t] // n), int(keys[t] % n), float(pair_scores[t])) for t in best]
+
+
+def render_similarity_table(ids: List[str], neighbors: Neighbors, label: Optional[Callable[[str], str]] = None) -> str:
+    label = label or str
     lines = ["| Paper A | Paper B | Similarity |", "|---|---|---:|"]
-    for a, b, s in pairs:
-        lines.append(f"| {a} | {b} | {s:.3f} |")
+    for i, j, s in top_pairs(neighbors, limit=10):
+        lines.append(f"| {label(ids[i])} | {label(ids[j])} | {s:.3f} |")
     return "\n".join(lines)
 
 
-def _select_representative(fig_paths: List[str], max_count: int = 4) -> List[str]:
+def select_representative(fig_paths: List[str], max_count: int = 4) -> List[str]:
     """Pick up to `max_count` representative images, spaced across the list.
 
     - If no images, return empty.
@@ -91,13 +225,67 @@ def _select_representative(fig_paths: List[str], max_count: int = 4) -> List[str
     return [fig_paths[i] for i in uniq[:k]]
 
 
+def _paper_section(it: Dict, report_dir: str, heading: str = "###") -> List[str]:
+    lines: List[str] = []
+    meta = it["metadata"]
+    title = meta.get("title") or it["paper_id"]
+    lines.append(f"{heading} {title} ({it['paper_id']})")
+    lines.append("")
+    lines.append(f"- 원본: `{meta.get('source_pdf')}`")
+    lines.append(f"- 페이지 수: {meta.get('page_count')}")
+    if meta.get("author"):
+        lines.append(f"- 저자: {meta.get('author')}")
+    if meta.get("creationDate"):
+        lines.append(f"- 발행일: {meta.get('creationDate')}")
+    lines.append("")
+    # Embed extracted figures as images (relative to report_dir)
+    fig_paths = it.get("figures_paths") or []
+    reps = select_representative(fig_paths, max_count=4)
+    thumbs = it.get("thumbnails") or {}
+    if reps:
+        lines.append("대표 이미지 (최대 4장):")
+        lines.append("")
+        for p in reps:
+            rel = os.path.relpath(p, start=report_dir)
+            alt = os.path.basename(p)
+            # Use HTML img for size control in most renderers
+            if p in thumbs:
+                # Small thumbnail inline; click through to the full-size figure
+                thumb_rel = os.path.relpath(thumbs[p], start=report_dir)
+                lines.append(f"<a href=\"{rel}\"><img src=\"{thumb_rel}\" alt=\"{alt}\" width=\"240\" /></a>")
+            else:
+                lines.append(f"<img src=\"{rel}\" alt=\"{alt}\" width=\"240\" />")
+        lines.append("")
+    else:
+        lines.append("추출 이미지: 없음")
+    lines.append("")
+    lines.append("요약:")
+    lines.append("")
+    lines.append(it["summary"].strip())
+    lines.append("")
+    return lines
+
+
 def generate_report(
     report_dir: str,
     corpus_summary: str,
     items: List[Dict],
+    n_clusters: Optional[int] = 3,
+    similarity: Optional[Tuple] = None,
+    cluster_summaries: Optional[Dict[int, str]] = None,
 ) -> str:
+    """Write report/summary.md.
+
+    `similarity` is a precomputed `compute_similarity_and_clusters` result
+    (the one the corpus synthesis was clustered with); `cluster_summaries`
+    are shown under their clusters. Written through `PageWriter`, so an
+    unchanged report is left untouched.
+    """
     os.makedirs(report_dir, exist_ok=True)
-    ids, sim, clusters = compute_similarity_and_clusters(items)
+    ids, neighbors, clusters = similarity or compute_similarity_and_clusters(items, n_clusters=n_clusters)
+    cluster_summaries = cluster_summaries or {}
+    titles = {it["paper_id"]: it["metadata"].get("title") or it["paper_id"] for it in items}
+    sections: List[List[str]] = []
 
     lines: List[str] = []
     lines.append("# 종합 보고서")
@@ -106,12 +294,14 @@ def generate_report(
     lines.append("")
     lines.append(corpus_summary.strip())
     lines.append("")
+    sections.append(lines)
 
+    lines = []
     lines.append("## (2) 논문 간 유사성/차별성")
     lines.append("")
     lines.append("### 유사도 상위 페어")
     if len(ids) >= 2:
-        lines.append(render_similarity_table(ids, sim))
+        lines.append(render_similarity_table(ids, neighbors))
     else:
         lines.append("단일 문서: 유사도 표 생략")
     lines.append("")
@@ -119,42 +309,162 @@ def generate_report(
     for cid, members in clusters.items():
         lines.append(f"- Cluster {cid}: {', '.join(members)}")
     lines.append("")
-
-    lines.append("## (3) 논문별 개별 요약")
-    lines.append("")
-    for it in items:
-        meta = it["metadata"]
-        title = meta.get("title") or it["paper_id"]
-        lines.append(f"### {title} ({it['paper_id']})")
+    sections.append(lines)
+    for cid, members in clusters.items():
+        synthesis = cluster_summaries.get(cid)
+        if not synthesis or len(members) < 2:
+            continue
+        lines = []
+        lines.append(f"#### Cluster {cid} 종합")
+        lines.append("")
+        lines.append(f"대상: {', '.join(titles.get(pid, pid) for pid in members)}")
         lines.append("")
-        lines.append(f"- 원본: `{meta.get('source_pdf')}`")
-        lines.append(f"- 페이지 수: {meta.get('page_count')}")
-        if meta.get("author"):
-            lines.append(f"- 저자: {meta.get('author')}")
-        if meta.get("creationDate"):
-            lines.append(f"- 발행일: {meta.get('creationDate')}")
+        lines.append(synthesis.strip())
         lines.append("")
-        # Embed extracted figures as images (relative to report_dir)
-        fig_paths = it.get("figures_paths") or []
-        reps = _select_representative(fig_paths, max_count=4)
-        if reps:
-            lines.append("대표 이미지 (최대 4장):")
+        sections.append(lines)
+
+    sections.append(["## (3) 논문별 개별 요약", ""])
+    for it in items:
+        sections.append(_paper_section(it, report_dir))
+
+    pages = PageWriter(report_dir)
+    pages.write("summary.md", [line for body in sections for line in body])
+    pages.close()
+    return os.path.join(report_dir, "summary.md")
+
+
+class PageWriter:
+    """Writes report pages one at a time, skipping pages whose content is unchanged.
+
+    Content hashes of the pages written last time are kept in
+    `<report_dir>/.pages.json`; a page with the same hash that still exists
+    is not touched. `close` removes pages that were not produced this run.
+    """
+
+    def __init__(self, report_dir: str) -> None:
+        self.report_dir = report_dir
+        self.manifest_path = os.path.join(report_dir, ".pages.json")
+        self.previous: Dict[str, str] = {}
+        self.hashes: Dict[str, str] = {}
+        self.written = 0
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self.previous = json.load(f).get("pages", {})
+            except (OSError, ValueError):
+                self.previous = {}
+
+    def write(self, relpath: str, lines: List[str]) -> bool:
+        """Write one page (path relative to the report dir); False if it was unchanged."""
+        text = "\n".join(lines)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = os.path.join(self.report_dir, relpath)
+        self.hashes[relpath] = digest
+        if self.previous.get(relpath) == digest and os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+        self.written += 1
+        return True
+
+    def close(self) -> None:
+        for relpath in set(self.previous) - set(self.hashes):
+            try:
+                os.remove(os.path.join(self.report_dir, relpath))
+            except OSError:
+                pass
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "pages": self.hashes}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+
+def generate_sharded_report(
+    report_dir: str,
+    corpus_summary: str,
+    items: List[Dict],
+    n_clusters: Optional[int] = 3,
+    similarity: Optional[Tuple] = None,
+    cluster_summaries: Optional[Dict[int, str]] = None,
+    related: int = 5,
+) -> Tuple[str, int, int]:
+    """Write the report as report/index.md, clusters/cluster_<id>.md and papers/<paper_id>.md.
+
+    Same content as `generate_report`, split so that no single page holds
+    the whole corpus. Each paper page also links its
+    `related` nearest neighbours. Pages are written as they are rendered and
+    only if changed (see `PageWriter`). Returns (index path, pages written,
+    pages total).
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    ids, neighbors, clusters = similarity or compute_similarity_and_clusters(items, n_clusters=n_clusters)
+    cluster_summaries = cluster_summaries or {}
+    titles = {it["paper_id"]: it["metadata"].get("title") or it["paper_id"] for it in items}
+    cluster_of = {pid: cid for cid, members in clusters.items() for pid in members}
+    writer = PageWriter(report_dir)
+
+    def paper_link(pid: str, base: str) -> str:
+        return f"[{titles.get(pid, pid)}]({base}papers/{pid}.md)"
+
+    lines: List[str] = []
+    lines.append("# 종합 보고서")
+    lines.append("")
+    lines.append(f"논문 {len(items)}편, 클러스터 {len(clusters)}개")
+    lines.append("")
+    lines.append("## (1) 전체 종합 요약")
+    lines.append("")
+    lines.append(corpus_summary.strip())
+    lines.append("")
+    lines.append("## (2) 논문 간 유사성/차별성")
+    lines.append("")
+    lines.append("### 유사도 상위 페어")
+    if len(ids) >= 2:
+        lines.append(render_similarity_table(ids, neighbors, label=lambda pid: paper_link(pid, "")))
+    else:
+        lines.append("단일 문서: 유사도 표 생략")
+    lines.append("")
+    lines.append("### 클러스터 결과")
+    for cid, members in clusters.items():
+        lines.append(f"- [Cluster {cid}](clusters/cluster_{cid}.md): {len(members)}편")
+    lines.append("")
+    writer.write("index.md", lines)
+
+    for cid, members in clusters.items():
+        lines = [f"# Cluster {cid}", "", "[← 종합 보고서](../index.md)", ""]
+        synthesis = cluster_summaries.get(cid)
+        if synthesis and len(members) > 1:
+            lines.append("## 종합")
             lines.append("")
-            for p in reps:
-                rel = os.path.relpath(p, start=report_dir)
-                alt = os.path.basename(p)
-                # Use HTML img for size control in most renderers
-                lines.append(f"<img src=\"{rel}\" alt=\"{alt}\" width=\"240\" />")
+            lines.append(synthesis.strip())
             lines.append("")
-        else:
-            lines.append("추출 이미지: 없음")
+        lines.append(f"## 논문 ({len(members)}편)")
         lines.append("")
-        lines.append("요약:")
-        lines.append("")
-        lines.append(it["summary"].strip())
+        for pid in members:
+            lines.append(f"- {paper_link(pid, '../')}")
         lines.append("")
+        writer.write(f"clusters/cluster_{cid}.md", lines)
+
+    idx, scores = neighbors
+    pos = {pid: i for i, pid in enumerate(ids)}
+    papers_dir = os.path.join(report_dir, "papers")
+    for it in items:
+        pid = it["paper_id"]
+        lines = _paper_section(it, papers_dir, heading="#")
+        cid = cluster_of.get(pid)
+        nav = "[← 종합 보고서](../index.md)"
+        if cid is not None:
+            nav += f" · [Cluster {cid}](../clusters/cluster_{cid}.md)"
+        lines[1:1] = ["", nav]
+        if pid in pos and idx.shape[1]:
+            lines.append("유사 논문:")
+            lines.append("")
+            for j, score in list(zip(idx[pos[pid]], scores[pos[pid]]))[:related]:
+                lines.append(f"- {paper_link(ids[int(j)], '../')} ({score:.3f})")
+            lines.append("")
+        writer.write(f"papers/{pid}.md", lines)
 
-    out_path = os.path.join(report_dir, "summary.md")
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-    return out_path
+    writer.close()
+    return os.path.join(report_dir, "index.md"), writer.written, len(writer.hashes)
@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the backend while its circuit is open."""
+
+
+def backoff_delay(attempt: int, base_sec: float = 1.0, max_sec: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry `attempt` (1-based)."""
+    cap = min(max_sec, base_sec * (2 ** max(0, attempt - 1)))
+    return random.uniform(0.0, max(0.0, cap))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire` blocks until `cost` units are available.
+
+    The bucket holds at most one second of `rate`. A cost larger than the
+    capacity is admitted once the bucket is full and leaves it in debt, so
+    oversized requests are slowed down rather than rejected.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0) -> None:
+        need = min(float(cost), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= need:
+                    self._tokens -= float(cost)
+                    return
+                wait = (need - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with periodic health probes.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `before_call` raises `CircuitOpenError` immediately. Once `cooldown_sec`
+    has passed, a single caller runs `probe` (or is let through as the probe
+    when none is given); success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown_sec: float = 30.0,
+        probe: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_sec = float(cooldown_sec)
+        self.probe = probe
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "half_open" or time.monotonic() - self._opened_at < self.cooldown_sec:
+                raise CircuitOpenError("LMStudio backend unavailable (circuit open)")
+            self.state = "half_open"
+        if self.probe is None:
+            # This caller's request is the probe
+            return
+        try:
+            healthy = bool(self.probe())
+        except Exception:
+            healthy = False
+        if healthy:
+            self.record_success()
+        else:
+            self.record_failure()
+            raise CircuitOpenError("LMStudio backend unavailable (health probe failed)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state != "closed" and time.monotonic() - self._opened_at < self.cooldown_sec
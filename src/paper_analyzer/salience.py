@@ -0,0 +1,73 @@
+import math
+import re
+from collections import Counter
+from typing import List, Optional
+
+_WORD_RE = re.compile(r"[^\W\d_]{2,}")
+_STOPWORDS = frozenset(
+    "the and for with that this from are was were been have has had not but its our their these those "
+    "into over such than then there which while when where what who can may also both each more most "
+    "other some only same very will would could should using used use based via per all any one two".split()
+)
+# Words that mark the passages a summary needs: contributions, method, results, limits
+SECTION_CUES = (
+    "abstract introduction contribution contributions propose proposed approach method methods model "
+    "framework dataset datasets experiment experiments evaluation results outperform improvement "
+    "accuracy baseline conclusion conclusions limitation limitations future"
+)
+_ABSTRACT_RE = re.compile(r"(?is)\babstract\b[\s.:—-]*(.{200,3000}?)(?:\n\s*(?:\d+\.?\s*|I\.\s*)?introduction\b|$)")
+_REFERENCE_LINE_RE = re.compile(r"^\s*(?:\[\d+\]|\d+\.\s+[A-Z][a-z]+,|[A-Z][a-z]+,\s+[A-Z]\.)|\bet al\.|\(\d{4}[a-z]?\)|\bdoi\b|arXiv", re.MULTILINE)
+_BACK_MATTER_RE = re.compile(r"(?im)^\s*(?:\d+\.?\s*)?(?:acknowledge?ments?|references|bibliography|appendix)\b")
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def bm25_scores(docs: List[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each document against `query`, with IDF over `docs`."""
+    tfs = [Counter(_terms(d)) for d in docs]
+    lengths = [sum(tf.values()) for tf in tfs]
+    avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+    df = Counter(t for tf in tfs for t in tf)
+    n = len(docs)
+    query_terms = set(_terms(query))
+    scores: List[float] = []
+    for tf, length in zip(tfs, lengths):
+        norm = k1 * (1 - b + b * length / avg_len) if avg_len else k1
+        score = 0.0
+        for t in query_terms:
+            f = tf.get(t)
+            if f:
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                score += idf * f * (k1 + 1) / (f + norm)
+        scores.append(score)
+    return scores
+
+
+def paper_query(chunks: List[str], title: Optional[str] = None) -> str:
+    """Query for ranking a paper's chunks: title, abstract and section cue words."""
+    head = chunks[0] if chunks else ""
+    m = _ABSTRACT_RE.search(head)
+    abstract = m.group(1) if m else head[:1500]
+    return " ".join(filter(None, [title, title, abstract, SECTION_CUES]))
+
+
+def select_salient_chunks(chunks: List[str], max_chunks: int, title: Optional[str] = None) -> List[int]:
+    """Indexes (in document order) of the `max_chunks` chunks worth summarizing.
+
+    The first chunk (title, abstract, introduction) is always kept; the rest
+    are ranked by BM25 against `paper_query`, with reference lists,
+    acknowledgements and appendices pushed down.
+    """
+    if max_chunks <= 0 or len(chunks) <= max_chunks:
+        return list(range(len(chunks)))
+    scores = bm25_scores(chunks, paper_query(chunks, title))
+    for i, chunk in enumerate(chunks):
+        lines = max(1, chunk.count("\n") + 1)
+        if len(_REFERENCE_LINE_RE.findall(chunk)) / lines > 0.3:
+            scores[i] *= 0.2
+        elif _BACK_MATTER_RE.search(chunk):
+            scores[i] *= 0.5
+    ranked = sorted(range(1, len(chunks)), key=lambda i: scores[i], reverse=True)
+    return sorted([0] + ranked[: max_chunks - 1])
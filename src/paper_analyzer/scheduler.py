@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+
+class LLMTaskScheduler:
+    """Single work queue for LLM calls across all papers.
+
+    Tasks run on a fixed number of worker threads (`concurrency` in-flight
+    requests). A task may depend on other tasks' futures; it is only queued once
+    all of them have finished, and fails with the first dependency error.
+    Lower `priority` values run first, so combine steps can overtake queued
+    chunk summaries and papers finish progressively. A task that returns a
+    Future (e.g. one it submitted itself) resolves with that future's outcome,
+    which lets a task expand into further tasks without holding a worker.
+    """
+
+    def __init__(self, concurrency: int = 4) -> None:
+        self.concurrency = max(1, int(concurrency))
+        self._cond = threading.Condition()
+        self._queue: List[Any] = []
+        self._seq = itertools.count()
+        self._unfinished = 0
+        self._closed = False
+        self._workers: List[threading.Thread] = []
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def __enter__(self) -> "LLMTaskScheduler":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if exc[0] is not None:
+            # Let the error (or Ctrl-C) through without running the rest of the queue
+            self.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.shutdown()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        deps: Optional[Sequence[Future]] = None,
+        priority: int = 10,
+        **kwargs: Any,
+    ) -> Future:
+        """Queue `fn(*args, **kwargs)` once all `deps` are done; returns its future."""
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is shut down")
+            self._unfinished += 1
+        deps = list(deps or [])
+        if not deps:
+            self._enqueue(priority, fut, fn, args, kwargs)
+            return fut
+
+        remaining = [len(deps)]
+        lock = threading.Lock()
+
+        def _on_dep_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            for d in deps:
+                err = d.exception() if not d.cancelled() else RuntimeError("dependency cancelled")
+                if err is not None:
+                    self._finish(fut, error=err)
+                    return
+            self._enqueue(priority, fut, fn, args, kwargs)
+
+        for d in deps:
+            d.add_done_callback(_on_dep_done)
+        return fut
+
+    def wait(self) -> None:
+        """Block until every submitted task has finished."""
+        with self._cond:
+            while self._unfinished > 0:
+                self._cond.wait()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """Stop the workers once the queue is drained.
+
+        With `cancel_futures`, queued tasks (and tasks whose dependencies finish
+        later) are cancelled instead of run; running tasks still complete.
+        """
+        if wait and not cancel_futures:
+            self.wait()
+        with self._cond:
+            self._closed = True
+            queued: List[Any] = []
+            if cancel_futures:
+                queued, self._queue = self._queue, []
+            self._cond.notify_all()
+        for entry in queued:
+            self._cancel(entry[2])
+        if wait:
+            for t in self._workers:
+                t.join()
+
+    def _enqueue(self, priority: int, fut: Future, fn: Callable, args: Any, kwargs: Any) -> None:
+        with self._cond:
+            if not self._closed:
+                heapq.heappush(self._queue, (priority, next(self._seq), fut, fn, args, kwargs))
+                self._cond.notify()
+                return
+        # Dependencies finished after shutdown: nobody will run it
+        self._cancel(fut)
+
+    def _cancel(self, fut: Future) -> None:
+        fut.cancel()
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def _finish(self, fut: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if fut.set_running_or_notify_cancel():
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def _finish_from(self, fut: Future, source: Future) -> None:
+        if source.cancelled():
+            self._finish(fut, error=RuntimeError("chained task cancelled"))
+        elif source.exception() is not None:
+            self._finish(fut, error=source.exception())
+        else:
+            self._finish(fut, result=source.result())
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _, _, fut, fn, args, kwargs = heapq.heappop(self._queue)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:  # propagate to the task's future
+                self._finish(fut, error=e)
+            else:
+                if isinstance(result, Future):
+                    result.add_done_callback(lambda r, fut=fut: self._finish_from(fut, r))
+                else:
+                    self._finish(fut, result=result)
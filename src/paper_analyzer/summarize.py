@@ -1,33 +1,26 @@
-from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import re
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from .lmstudio import LMStudioClient
-from .text_utils import chunk_text
+from .salience import select_salient_chunks
+from .scheduler import LLMTaskScheduler
+from .text_utils import (
+    estimate_tokens,
+    iter_chunks,
+    iter_chunks_structured,
+    iter_chunks_structured_tokens,
+    iter_chunks_tokens,
+)
 
+SYSTEM_PROMPT = "You are a helpful research assistant."
 
-def summarize_single_paper(
-    client: LMStudioClient,
-    paper_text: str,
-    paper_meta: Dict,
-    max_chunk_chars: int = 4000,
-    temperature: float = 0.2,
-    max_output_tokens: Optional[int] = None,
-    on_progress: Optional[Callable[[str, Dict], None]] = None,
-    chunk_summary_words: Optional[str] = "120-160",
-) -> str:
-    """Map-reduce style summarization for a single paper."""
-    title = paper_meta.get("title") or paper_meta.get("paper_id")
-    chunks = chunk_text(paper_text, max_chars=max_chunk_chars)
-    if not chunks:
-        return ""
-
-    if on_progress:
-        try:
-            on_progress("chunking_done", {"chunks": len(chunks), "title": title})
-        except Exception:
-            pass
 
-    chunk_summaries: List[str] = []
-    # Build word constraint text for chunk summaries
+def _word_clause(chunk_summary_words: Optional[str]) -> Optional[str]:
+    """Build word constraint text for chunk summaries."""
     word_clause = None
     if chunk_summary_words:
         txt = str(chunk_summary_words).strip()
@@ -49,65 +42,323 @@ def summarize_single_paper(
             cleaned = chunk_summary_words.strip()
             if cleaned:
                 word_clause = cleaned if cleaned.lower().endswith("word") or cleaned.lower().endswith("words") else f"{cleaned} words."
+    return word_clause
 
-    for i, ch in enumerate(chunks):
-        prompt = (
-            f"You are analyzing a research paper titled: {title}.\n"
-            "Summarize the following excerpt focusing on: problem, method, data, key results, and limitations.\n"
-            f"Use concise academic tone. {word_clause or '120-160 words.'}\n\n"
-            f"Excerpt {i+1}/{len(chunks)}:\n" + ch
-        )
-        content = client.chat_complete([
-            {"role": "system", "content": "You are a helpful research assistant."},
-            {"role": "user", "content": prompt},
-        ], temperature=temperature, max_tokens=max_output_tokens)
-        chunk_summaries.append(content)
 
-        if on_progress:
-            try:
-                on_progress("chunk_summarized", {"i": i + 1, "total": len(chunks), "title": title})
-            except Exception:
-                pass
+def _chunk_prompt(word_clause: Optional[str], excerpt: str) -> str:
+    # No title or position: the prompt depends only on the excerpt, so its
+    # summary can be reused across re-chunking, retitling and duplicate papers
+    return (
+        "You are analyzing an excerpt from a research paper.\n"
+        "Summarize the following excerpt focusing on: problem, method, data, key results, and limitations.\n"
+        f"Use concise academic tone. {word_clause or '120-160 words.'}\n\n"
+        "Excerpt:\n" + excerpt
+    )
 
-    combined_prompt = (
+
+def _combine_prompt(title: str, summaries: List[str]) -> str:
+    return (
         "Combine the following excerpt summaries into a cohesive summary of the paper.\n"
         "Structure the output with labeled sections: Problem, Method, Data, Results, Limitations.\n"
         "Keep it 250-350 words, objective, and specific.\n\n"
         f"Title: {title}\n\n"
-        "Excerpt summaries:\n" + "\n\n".join(f"- {s}" for s in chunk_summaries)
+        "Excerpt summaries:\n" + "\n\n".join(f"- {s}" for s in summaries)
     )
 
-    if on_progress:
-        try:
-            on_progress("combining", {"title": title})
-        except Exception:
-            pass
 
-    combined = client.chat_complete([
-        {"role": "system", "content": "You are a helpful research assistant."},
-        {"role": "user", "content": combined_prompt},
-    ], temperature=temperature, max_tokens=max_output_tokens)
-    final = combined.strip()
+def _merge_prompt(title: str, summaries: List[str]) -> str:
+    # Intermediate tree-reduce step: condense without imposing the final layout
+    return (
+        "Merge the following summaries of consecutive excerpts from one paper into a single summary.\n"
+        "Keep every concrete method detail, dataset, number and limitation; drop repetition.\n"
+        "Use concise academic tone. 200-300 words.\n\n"
+        f"Title: {title}\n\n"
+        "Excerpt summaries:\n" + "\n\n".join(f"- {s}" for s in summaries)
+    )
+
+
+def normalize_chunk(text: str) -> str:
+    """Canonical form of a chunk for memoization (NFKC, collapsed whitespace)."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def chunk_memo_key(
+    client: LMStudioClient,
+    chunk: str,
+    word_clause: Optional[str],
+    temperature: float,
+    max_output_tokens: Optional[int],
+) -> Dict[str, Any]:
+    """Cache payload for a chunk summary, independent of paper title and position."""
+    instructions = json.dumps(client.pre_messages, sort_keys=True, ensure_ascii=False)
+    return {
+        "kind": "chunk_summary",
+        "v": 1,
+        "content": hashlib.sha256(normalize_chunk(chunk).encode("utf-8")).hexdigest(),
+        "model": client.model,
+        "instructions": hashlib.sha256(instructions.encode("utf-8")).hexdigest(),
+        "words": word_clause or "120-160 words.",
+        "temperature": temperature,
+        "max_tokens": max_output_tokens,
+    }
+
+
+def chunk_token_budget(
+    client: LMStudioClient,
+    context_length: int,
+    max_output_tokens: Optional[int],
+    word_clause: Optional[str] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> int:
+    """Tokens left for the excerpt: context - prompt overhead - max output tokens.
+
+    Keeps 5% of the context in reserve for chat-template tokens and
+    tokenizer estimation error.
+    """
+    messages = client._merge_messages([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": _chunk_prompt(word_clause, "")},
+    ])
+    overhead = sum(count_tokens(m.get("content", "")) + 4 for m in messages)
+    reserve = int(context_length * 0.05)
+    return max(256, context_length - overhead - (max_output_tokens or 512) - reserve)
+
+
+def combine_token_budget(
+    client: LMStudioClient,
+    context_length: int,
+    max_output_tokens: Optional[int],
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> int:
+    """Tokens available for the summaries in one combine prompt (see `chunk_token_budget`)."""
+    prompt = max(_combine_prompt("", []), _merge_prompt("", []), key=len)
+    messages = client._merge_messages([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ])
+    # Room for the title as well
+    overhead = sum(count_tokens(m.get("content", "")) + 4 for m in messages) + 64
+    reserve = int(context_length * 0.05)
+    return max(256, context_length - overhead - (max_output_tokens or 512) - reserve)
+
+
+def batch_summaries(
+    summaries: List[str],
+    budget: Optional[int],
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> List[List[str]]:
+    """Split consecutive summaries into batches whose total stays within `budget` tokens.
+
+    Every batch but the last holds at least two summaries, so each reduce
+    level at least halves the count even when single summaries are large.
+    """
+    if not budget:
+        return [list(summaries)]
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    used = 0
+    for s in summaries:
+        n = count_tokens(s) + 2
+        if len(batch) >= 2 and used + n > budget:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(s)
+        used += n
+    if batch or not batches:
+        batches.append(batch)
+    return batches
+
+
+def _emit(on_progress: Optional[Callable[[str, Dict], None]], event: str, data: Dict) -> None:
     if on_progress:
         try:
-            on_progress("paper_done", {"title": title})
+            on_progress(event, data)
         except Exception:
             pass
-    return final
 
 
-def synthesize_corpus_summary(
+def schedule_paper_summary(
+    scheduler: LLMTaskScheduler,
     client: LMStudioClient,
-    paper_summaries: List[Dict],
+    paper_text: Union[str, Iterable[str]],
+    paper_meta: Dict,
+    max_chunk_chars: int = 4000,
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+    on_progress: Optional[Callable[[str, Dict], None]] = None,
+    chunk_summary_words: Optional[str] = "120-160",
+    context_length: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    structured: bool = False,
+    overlap_sentences: int = 0,
+    combine_budget: Optional[int] = None,
+    max_chunks: Optional[int] = None,
+) -> Future:
+    """Queue one task per chunk summary plus a combine task on `scheduler`.
+
+    The combine task depends on all of the paper's chunk tasks; the returned
+    future resolves to the final paper summary. With `context_length`, chunks
+    are packed by token count to fill the model's context window instead of
+    being cut at `max_chunk_chars`. With `structured`, chunks end at section,
+    paragraph or sentence boundaries and overlap by the section heading plus
+    `overlap_sentences` sentences instead of a fixed character window.
+
+    Chunk summaries are combined as a tree: consecutive summaries are batched
+    to fit `combine_budget` tokens (derived from `context_length` when None;
+    0 or no known context combines everything at once), each batch is merged by its own
+    task, and the merged summaries are reduced again until one batch is left
+    for the final combine. Depth grows with log(chunks).
+
+    Budget mode (`max_chunks`) ranks the chunks with BM25 against the title,
+    abstract and section cues and only summarizes the `max_chunks` best ones.
+    If that leaves a single chunk, its summary is the paper summary and no
+    combine call is made.
+    Ranking needs every chunk, so streamed input is buffered in this mode.
+
+    `paper_text` may also be an iterable of text pieces (e.g. pages): chunks
+    are queued as soon as they are complete, so summarization starts before
+    the whole document has been read. The chunk total is only reported
+    ("chunking_done") once the input is exhausted.
+    """
+    title = paper_meta.get("title") or paper_meta.get("paper_id")
+    word_clause = _word_clause(chunk_summary_words)
+    pieces = [paper_text] if isinstance(paper_text, str) else paper_text
+    if context_length:
+        budget = chunk_token_budget(client, context_length, max_output_tokens, word_clause, count_tokens)
+        if structured:
+            chunks = iter_chunks_structured_tokens(pieces, budget, overlap_sentences, count_tokens)
+        else:
+            chunks = iter_chunks_tokens(pieces, max_tokens=budget, count_tokens=count_tokens)
+    elif structured:
+        chunks = iter_chunks_structured(pieces, max_chars=max_chunk_chars, overlap_sentences=overlap_sentences)
+    else:
+        chunks = iter_chunks(pieces, max_chars=max_chunk_chars)
+    # Unknown until the chunk stream is exhausted
+    total: List[Optional[int]] = [None]
+
+    def _on_stream(stats: Dict) -> None:
+        _emit(on_progress, "stream_stats", {"title": title, **stats})
+
+    def _summarize_chunk(i: int, ch: str) -> str:
+        # Cached once, under a key independent of paper title and position
+        memo = chunk_memo_key(client, ch, word_clause, temperature, max_output_tokens) if client.cache else None
+        content = client.chat_complete([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": _chunk_prompt(word_clause, ch)},
+        ], temperature=temperature, max_tokens=max_output_tokens, on_stream=_on_stream, cache_key=memo)
+        _emit(on_progress, "chunk_summarized", {"i": i + 1, "total": total[0], "title": title})
+        return content
+
+    chunk_futures: List[Future] = []
+    if isinstance(paper_text, str) or max_chunks:
+        # Whole text at hand (or needed for ranking): report the total before any chunk completes
+        chunks = list(chunks)
+        if max_chunks and len(chunks) > max_chunks:
+            keep = select_salient_chunks(chunks, max_chunks, title)
+            _emit(on_progress, "chunks_skipped", {"skipped": len(chunks) - len(keep), "title": title})
+            chunks = [chunks[i] for i in keep]
+        total[0] = len(chunks)
+        if chunks:
+            _emit(on_progress, "chunking_done", {"chunks": total[0], "title": title})
+    for i, ch in enumerate(chunks):
+        if total[0] is None:
+            _emit(on_progress, "chunk_queued", {"i": i + 1, "title": title})
+        chunk_futures.append(scheduler.submit(_summarize_chunk, i, ch))
+    if total[0] is None:
+        total[0] = len(chunk_futures)
+        if chunk_futures:
+            _emit(on_progress, "chunking_done", {"chunks": total[0], "title": title})
+    if not chunk_futures:
+        done: Future = Future()
+        done.set_result("")
+        return done
+
+    if max_chunks and len(chunk_futures) == 1:
+        def _sole(fut: Future) -> str:
+            _emit(on_progress, "paper_done", {"title": title})
+            return fut.result().strip()
+
+        return scheduler.submit(_sole, chunk_futures[0], deps=chunk_futures, priority=0)
+
+    if combine_budget is None and context_length:
+        combine_budget = combine_token_budget(client, context_length, max_output_tokens, count_tokens)
+
+    def _complete(prompt: str) -> str:
+        return client.chat_complete([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ], temperature=temperature, max_tokens=max_output_tokens, on_stream=_on_stream).strip()
+
+    def _reduce(futures: List[Future], level: int) -> Union[str, Future]:
+        summaries = [f.result() for f in futures]
+        batches = batch_summaries(summaries, combine_budget, count_tokens)
+        _emit(on_progress, "combining", {"title": title, "level": level, "batches": len(batches)})
+        if len(batches) == 1:
+            final = _complete(_combine_prompt(title, batches[0]))
+            _emit(on_progress, "paper_done", {"title": title})
+            return final
+        # Merge each batch in parallel, then reduce the merged summaries again
+        merged: List[Future] = []
+        for batch in batches:
+            if len(batch) == 1:
+                done: Future = Future()
+                done.set_result(batch[0])
+                merged.append(done)
+            else:
+                merged.append(scheduler.submit(_complete, _merge_prompt(title, batch), priority=0))
+        return scheduler.submit(_reduce, merged, level + 1, deps=merged, priority=0)
+
+    # Combine steps jump ahead of queued chunk work so papers complete in order
+    return scheduler.submit(_reduce, chunk_futures, 0, deps=chunk_futures, priority=0)
+
+
+def summarize_single_paper(
+    client: LMStudioClient,
+    paper_text: str,
+    paper_meta: Dict,
+    max_chunk_chars: int = 4000,
     temperature: float = 0.2,
     max_output_tokens: Optional[int] = None,
+    on_progress: Optional[Callable[[str, Dict], None]] = None,
+    chunk_summary_words: Optional[str] = "120-160",
+    context_length: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    structured: bool = False,
+    overlap_sentences: int = 0,
+    combine_budget: Optional[int] = None,
+    max_chunks: Optional[int] = None,
 ) -> str:
-    """Create an overall synthesis across all papers."""
-    bullets = []
-    for p in paper_summaries:
-        bullets.append(f"Title: {p['metadata'].get('title')}\nSummary: {p['summary']}")
+    """Map-reduce style summarization for a single paper (one request at a time)."""
+    with LLMTaskScheduler(concurrency=1) as scheduler:
+        fut = schedule_paper_summary(
+            scheduler,
+            client,
+            paper_text,
+            paper_meta,
+            max_chunk_chars=max_chunk_chars,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            on_progress=on_progress,
+            chunk_summary_words=chunk_summary_words,
+            context_length=context_length,
+            count_tokens=count_tokens,
+            structured=structured,
+            overlap_sentences=overlap_sentences,
+            combine_budget=combine_budget,
+            max_chunks=max_chunks,
+        )
+        return fut.result()
+
 
-    prompt = (
+CORPUS_SYSTEM_PROMPT = "You are an expert research synthesizer."
+
+
+def _paper_bullet(paper: Dict) -> str:
+    return f"Title: {paper['metadata'].get('title')}\nSummary: {paper['summary']}"
+
+
+def _corpus_prompt(bullets: List[str]) -> str:
+    return (
         "You are reviewing multiple research papers. Create a comprehensive synthesis including:\n"
         "- Field context and overarching themes\n"
         "- Key methods and trends\n"
@@ -116,8 +367,166 @@ def synthesize_corpus_summary(
         "Write 350-500 words in clear, structured prose.\n\n"
         "Inputs:\n" + "\n\n".join(bullets)
     )
+
+
+def _cluster_prompt(bullets: List[str]) -> str:
+    return (
+        "You are reviewing a group of closely related research papers. Synthesize the group:\n"
+        "- Shared problem and context\n"
+        "- Methods used and how they differ between papers\n"
+        "- Consistent and conflicting findings\n"
+        "Write 200-300 words in clear prose, naming papers where they differ.\n\n"
+        "Inputs:\n" + "\n\n".join(bullets)
+    )
+
+
+def _overview_prompt(groups: List[str]) -> str:
+    return (
+        "You are reviewing multiple research papers, given as syntheses of groups of related papers. "
+        "Create a comprehensive synthesis including:\n"
+        "- Field context and overarching themes\n"
+        "- Key methods and trends across groups\n"
+        "- Consensus findings and points of disagreement\n"
+        "- Notable gaps and future directions\n"
+        "Write 350-500 words in clear, structured prose.\n\n"
+        "Groups:\n" + "\n\n".join(groups)
+    )
+
+
+def synthesize_corpus_summary(
+    client: LMStudioClient,
+    paper_summaries: List[Dict],
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+) -> str:
+    """Create an overall synthesis across all papers."""
+    bullets = [_paper_bullet(p) for p in paper_summaries]
     resp = client.chat_complete([
-        {"role": "system", "content": "You are an expert research synthesizer."},
-        {"role": "user", "content": prompt},
+        {"role": "system", "content": CORPUS_SYSTEM_PROMPT},
+        {"role": "user", "content": _corpus_prompt(bullets)},
     ], temperature=temperature, max_tokens=max_output_tokens)
     return resp.strip()
+
+
+def schedule_cluster_synthesis(
+    scheduler: LLMTaskScheduler,
+    client: LMStudioClient,
+    paper_summaries: List[Dict],
+    clusters: Dict[int, List[str]],
+    token_budget: Optional[int] = None,
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    cached: Optional[Dict[int, str]] = None,
+) -> Future:
+    """Map-reduce corpus synthesis over clusters of related papers.
+
+    Each cluster (paper ids from `report.compute_similarity_and_clusters`) is
+    synthesized by its own task, in parallel; clusters whose papers exceed
+    `token_budget` are reduced in batches first. The cluster syntheses are
+    then merged into the overview the same way. The future resolves to
+    (overview, {cluster id: cluster synthesis}); single-paper clusters reuse
+    the paper summary, and clusters in `cached` their stored synthesis,
+    without an LLM call.
+    """
+    by_id = {p["paper_id"]: p for p in paper_summaries}
+
+    def _complete(prompt: str) -> str:
+        return client.chat_complete([
+            {"role": "system", "content": CORPUS_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ], temperature=temperature, max_tokens=max_output_tokens).strip()
+
+    def _reduce(texts: List[str], prompt: Callable[[List[str]], str]) -> Union[str, Future]:
+        batches = batch_summaries(texts, token_budget, count_tokens)
+        if len(batches) == 1:
+            return _complete(prompt(batches[0]))
+        merged: List[Future] = []
+        for batch in batches:
+            if len(batch) == 1:
+                done: Future = Future()
+                done.set_result(batch[0])
+                merged.append(done)
+            else:
+                merged.append(scheduler.submit(_complete, prompt(batch), priority=0))
+        return scheduler.submit(_reduce_done, merged, prompt, deps=merged, priority=0)
+
+    def _reduce_done(futures: List[Future], prompt: Callable[[List[str]], str]) -> Union[str, Future]:
+        return _reduce([f.result() for f in futures], prompt)
+
+    cluster_futures: Dict[int, Future] = {}
+    for cid, members in clusters.items():
+        papers = [by_id[pid] for pid in members if pid in by_id]
+        if not papers:
+            continue
+        if cached and cid in cached:
+            done = Future()
+            done.set_result(cached[cid])
+            cluster_futures[cid] = done
+        elif len(papers) == 1:
+            done = Future()
+            done.set_result(papers[0]["summary"].strip())
+            cluster_futures[cid] = done
+        else:
+            cluster_futures[cid] = scheduler.submit(_reduce, [_paper_bullet(p) for p in papers], _cluster_prompt)
+
+    def _overview() -> Union[str, Future]:
+        groups = []
+        for cid, fut in cluster_futures.items():
+            titles = "; ".join(str(by_id[pid]["metadata"].get("title") or pid) for pid in clusters[cid] if pid in by_id)
+            groups.append(f"Group {cid} ({titles}):\n{fut.result()}")
+        return _reduce(groups, _overview_prompt)
+
+    overview = scheduler.submit(_overview, deps=list(cluster_futures.values()), priority=0)
+    return scheduler.submit(
+        lambda: (overview.result(), {cid: f.result() for cid, f in cluster_futures.items()}),
+        deps=[overview],
+        priority=0,
+    )
+
+
+def uses_single_synthesis(
+    paper_summaries: List[Dict],
+    token_budget: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    mode: str = "auto",
+) -> bool:
+    """Whether `synthesize_corpus` takes the single-prompt path (no cluster syntheses)."""
+    return mode == "single" or (mode == "auto" and len(batch_summaries(
+        [_paper_bullet(p) for p in paper_summaries], token_budget, count_tokens
+    )) == 1)
+
+
+def synthesize_corpus(
+    scheduler: LLMTaskScheduler,
+    client: LMStudioClient,
+    paper_summaries: List[Dict],
+    clusters: Dict[int, List[str]],
+    token_budget: Optional[int] = None,
+    temperature: float = 0.2,
+    max_output_tokens: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    mode: str = "auto",
+    cached: Optional[Dict[int, str]] = None,
+) -> Tuple[str, Dict[int, str]]:
+    """Corpus overview plus per-cluster syntheses.
+
+    `mode="auto"` keeps the single-prompt synthesis while every paper fits in
+    `token_budget` (no cluster syntheses then) and switches to the cluster
+    map-reduce beyond it; "single" and "clusters" force either path.
+    `cached` syntheses (by cluster id) are reused instead of regenerated.
+    """
+    if uses_single_synthesis(paper_summaries, token_budget, count_tokens, mode):
+        return synthesize_corpus_summary(client, paper_summaries, temperature, max_output_tokens), {}
+    fut = schedule_cluster_synthesis(
+        scheduler,
+        client,
+        paper_summaries,
+        clusters,
+        token_budget=token_budget,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        count_tokens=count_tokens,
+        cached=cached,
+    )
+    return fut.result()
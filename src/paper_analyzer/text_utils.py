@@ -1,21 +1,292 @@
-from typing import List
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
 
 def chunk_text(text: str, max_chars: int = 4000, overlap: int = 200) -> List[str]:
     """Chunk text by characters with slight overlap to preserve context."""
+    return list(iter_chunks([text], max_chars=max_chars, overlap=overlap))
+
+
+def iter_chunks(pieces: Iterable[str], max_chars: int = 4000, overlap: int = 200) -> Iterator[str]:
+    """Streaming `chunk_text`: emit chunks as text pieces (e.g. pages) arrive.
+
+    Produces exactly the chunks `chunk_text` would for the concatenated text,
+    while only holding about one chunk of look-ahead in memory.
+    """
+
+    def _span(buf: str, start: int) -> Tuple[int, int]:
+        end = min(len(buf), start + max_chars)
+        return end, max(0, end - overlap)
+
+    return _stream_chunks(pieces, max_chars, _span)
+
+
+def _stream_chunks(
+    pieces: Iterable[str],
+    lookahead: int,
+    span: Callable[[str, int], Tuple[int, int]],
+) -> Iterator[str]:
+    """Drive a chunker over streamed text.
+
+    `span(buf, start)` returns (end, next_start) for the chunk starting at
+    `start`; it is only called once more than `lookahead` characters past
+    `start` are buffered or the input is exhausted.
+    """
+    it = iter(pieces)
+    buf = ""
+    start = 0
+    exhausted = False
+    while True:
+        parts = [buf]
+        have = len(buf) - start
+        while not exhausted and have <= lookahead:
+            piece = next(it, None)
+            if piece is None:
+                exhausted = True
+            else:
+                parts.append(piece)
+                have += len(piece)
+        buf = "".join(parts)
+        if start >= len(buf):
+            return
+        end, next_start = span(buf, start)
+        yield buf[start:end]
+        if exhausted and end >= len(buf):
+            return
+        # Drop text no later chunk can reach
+        buf, start = buf[next_start:], 0
+
+# Hangul, CJK ideographs, kana and full-width forms: roughly one token per character
+_CJK_RE = re.compile(r"[\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast heuristic token count: ~1 token per CJK character, ~4 characters per token otherwise."""
     if not text:
-        return []
-    chunks: List[str] = []
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def get_tokenizer(name: Optional[str] = None) -> Callable[[str], int]:
+    """Return a token counting function.
+
+    - None or "heuristic": `estimate_tokens`.
+    - "tiktoken[:<encoding>]": exact counts via tiktoken if it is installed,
+      otherwise falls back to the heuristic.
+    """
+    if not name or name == "heuristic":
+        return estimate_tokens
+    if name.startswith("tiktoken"):
+        encoding_name = name.split(":", 1)[1] if ":" in name else "cl100k_base"
+        try:
+            import tiktoken  # optional dependency
+        except ImportError:
+            return estimate_tokens
+        enc = tiktoken.get_encoding(encoding_name)
+        return lambda text: len(enc.encode(text, disallowed_special=()))
+    raise ValueError(f"unknown tokenizer: {name}")
+
+
+def chunk_text_tokens(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int = 50,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> List[str]:
+    """Chunk text so each chunk holds at most `max_tokens` tokens.
+
+    Chunk ends are found by binary search over `count_tokens` and pulled back
+    to the nearest whitespace, so any tokenizer can be plugged in.
+    """
+    return list(iter_chunks_tokens([text], max_tokens, overlap_tokens, count_tokens))
+
+
+def iter_chunks_tokens(
+    pieces: Iterable[str],
+    max_tokens: int,
+    overlap_tokens: int = 50,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """Streaming `chunk_text_tokens` over text pieces."""
+    max_tokens = max(1, int(max_tokens))
+    # No tokenizer packs more than ~10 characters into a token
+    window = max_tokens * 10
+
+    def _span(text: str, start: int) -> Tuple[int, int]:
+        n = len(text)
+        hi = min(n, start + window)
+        if count_tokens(text[start:hi]) <= max_tokens:
+            end = hi
+        else:
+            lo = start + 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if count_tokens(text[start:mid]) <= max_tokens:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            end = lo
+            # Prefer a whitespace boundary within the last tenth of the chunk
+            cut = max(text.rfind(" ", start, end), text.rfind("\n", start, end))
+            if cut > start + (end - start) * 9 // 10:
+                end = cut + 1
+        overlap_chars = (end - start) * overlap_tokens // max_tokens if overlap_tokens > 0 else 0
+        return end, max(start + 1, end - overlap_chars)
+
+    return _stream_chunks(pieces, window + 1, _span)
+
+
+# Numbered ("2.1 Method", "IV. Results") or well-known unnumbered section headings
+_HEADING_RE = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z가-힣][^.!?:;,]{0,80}"
+    r"|(?i:abstract|introduction|related work|background|preliminaries|methods?|methodology|approach"
+    r"|experiments?|evaluation|results|discussion|conclusions?|limitations|future work"
+    r"|acknowledge?ments?|references|bibliography|appendix(?:\s+[a-z0-9][^.]{0,60})?"
+    r"|초록|서론|관련\s*연구|방법|실험|결과|결론|참고\s*문헌|부록))\s*:?\s*$"
+)
+_SENTENCE_END_RE = re.compile(r"[.!?。！？][\"'”’)\]]*\s*$")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?。！？])[\"'”’)\]]*\s+")
+
+
+def _iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """Lines of streamed text, each keeping its trailing newline."""
+    rest = ""
+    for piece in pieces:
+        rest += piece
+        if "\n" not in piece:
+            continue
+        *lines, rest = rest.split("\n")
+        for line in lines:
+            yield line + "\n"
+    if rest:
+        yield rest
+
+
+def _iter_blocks(pieces: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Split text into ("heading" | "para", text) blocks without altering it.
+
+    PDF text rarely has blank lines between paragraphs, so a line that ends
+    a sentence well short of the usual line width also ends a paragraph.
+    """
+    para: List[str] = []
+    width = 40
+    for line in _iter_lines(pieces):
+        stripped = line.strip()
+        if stripped and len(stripped) <= 100 and _HEADING_RE.match(stripped):
+            if para:
+                yield "para", "".join(para)
+                para = []
+            yield "heading", line
+            continue
+        para.append(line)
+        width = max(width, len(stripped))
+        if not stripped or (_SENTENCE_END_RE.search(stripped) and len(stripped) < width * 0.75):
+            yield "para", "".join(para)
+            para = []
+    if para:
+        yield "para", "".join(para)
+
+
+def _split_sentences(text: str) -> List[str]:
+    parts: List[str] = []
     start = 0
-    n = len(text)
-    while start < n:
-        end = min(n, start + max_chars)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        if end == n:
-            break
-        start = end - overlap
-        if start < 0:
-            start = 0
-    return chunks
+    for m in _SENTENCE_SPLIT_RE.finditer(text):
+        parts.append(text[start:m.end()])
+        start = m.end()
+    if start < len(text):
+        parts.append(text[start:])
+    return parts
+
+
+def _pack_blocks(
+    blocks: Iterable[Tuple[str, str]],
+    max_size: int,
+    size: Callable[[str], int],
+    split_long: Callable[[str], Iterable[str]],
+    overlap_sentences: int,
+) -> Iterator[str]:
+    """Greedily pack blocks into chunks of at most `max_size`.
+
+    A paragraph that does not fit is split into sentences to fill the chunk,
+    and sentences longer than a chunk go through `split_long`. Headings are
+    never split: a new section starts a new chunk when its heading does not
+    fit or less than an eighth of the current chunk is left. A chunk that
+    starts mid-section is prefixed with the section heading plus the last
+    `overlap_sentences` sentences of the previous chunk. Every unit is
+    measured at most twice, so the cost is linear in the text length.
+    """
+    parts: List[str] = []
+    used = 0
+    heading: Optional[str] = None
+
+    def _carry() -> Tuple[List[str], int]:
+        carry: List[str] = []
+        if heading is not None:
+            carry.append(heading)
+        if overlap_sentences > 0 and parts:
+            carry.extend(_split_sentences(parts[-1])[-overlap_sentences:])
+        return carry, sum(size(c) for c in carry)
+
+    for kind, text in blocks:
+        n = size(text)
+        if kind == "heading":
+            # The heading opens the next chunk itself, so nothing is carried
+            if parts and (used + n > max_size or max_size - used < max_size // 8):
+                yield "".join(parts)
+                parts, used = [], 0
+            heading = text
+            units = [(text, n)] if n <= max_size else [(piece, size(piece)) for piece in split_long(text)]
+        elif n <= max_size and (used + n <= max_size or max_size - used < max_size // 8):
+            units = [(text, n)]
+        else:
+            # Fill the rest of this chunk sentence by sentence
+            units = [
+                (piece, size(piece))
+                for sentence in _split_sentences(text)
+                for piece in ([sentence] if size(sentence) <= max_size else split_long(sentence))
+            ]
+        for unit, n in units:
+            if parts and used + n > max_size:
+                chunk = "".join(parts)
+                carry, carried = _carry()
+                yield chunk
+                parts, used = ([], 0) if carried + n > max_size else (carry, carried)
+            parts.append(unit)
+            used += n
+    if parts and "".join(parts).strip():
+        yield "".join(parts)
+
+
+def iter_chunks_structured(pieces: Iterable[str], max_chars: int = 4000, overlap_sentences: int = 0) -> Iterator[str]:
+    """Chunk streamed text at section, paragraph and sentence boundaries (by characters)."""
+    max_chars = max(1, int(max_chars))
+    return _pack_blocks(
+        _iter_blocks(pieces),
+        max_chars,
+        len,
+        lambda s: chunk_text(s, max_chars=max_chars, overlap=0),
+        overlap_sentences,
+    )
+
+
+def iter_chunks_structured_tokens(
+    pieces: Iterable[str],
+    max_tokens: int,
+    overlap_sentences: int = 0,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """Token-budget variant of `iter_chunks_structured`.
 
+    Chunk sizes are the sum of their blocks' token counts, which for the
+    bundled tokenizers never undercounts the joined text by more than a
+    token per block boundary.
+    """
+    max_tokens = max(1, int(max_tokens))
+    return _pack_blocks(
+        _iter_blocks(pieces),
+        max_tokens,
+        count_tokens,
+        lambda s: chunk_text_tokens(s, max_tokens=max_tokens, overlap_tokens=0, count_tokens=count_tokens),
+        overlap_sentences,
+    )
@@ -0,0 +1,43 @@
+import os
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+
+def thumbnail_path(fig_path: str) -> str:
+    """Thumbnail location next to the original: img_000.png -> img_000_thumb.jpg."""
+    root, _ = os.path.splitext(fig_path)
+    return f"{root}_thumb.jpg"
+
+
+def make_thumbnail(fig_path: str, max_width: int = 480, quality: int = 75) -> str:
+    """Write a downscaled JPEG next to `fig_path` (skipped if already up to date)."""
+    out_path = thumbnail_path(fig_path)
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(fig_path):
+        return out_path
+    pix = fitz.Pixmap(fig_path)
+    if pix.alpha:
+        # JPEG has no alpha channel
+        pix = fitz.Pixmap(pix, 0)
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if pix.width > max_width:
+        height = max(1, round(pix.height * max_width / pix.width))
+        pix = fitz.Pixmap(pix, max_width, height, None)
+    pix.save(out_path, jpg_quality=quality)
+    return out_path
+
+
+def make_thumbnails(fig_paths: List[str], max_width: int = 480, quality: int = 75) -> Dict[str, str]:
+    """Thumbnail several figures; returns {figure path: thumbnail path} for the ones that worked.
+
+    Module-level so it can run in a process pool.
+    """
+    thumbs: Dict[str, str] = {}
+    for p in fig_paths:
+        try:
+            thumbs[p] = make_thumbnail(p, max_width=max_width, quality=quality)
+        except Exception:
+            # The report falls back to the full-size image
+            continue
+    return thumbs
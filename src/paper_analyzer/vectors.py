@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from .cache import lock_file
+
+HASH_FEATURES = 1 << 18
+HASH_DIM = 512
+# Embedding models have short input windows; summaries rarely need more
+EMBED_MAX_CHARS = 2000
+
+
+def content_sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=4)
+def _projection(dim: int, seed: int) -> sparse.csr_matrix:
+    """Fixed sparse random projection (Achlioptas) from the hashed space to `dim`."""
+    rng = np.random.default_rng(seed)
+    density = 1 / np.sqrt(HASH_FEATURES)
+    nnz = int(HASH_FEATURES * dim * density)
+    rows = rng.integers(0, HASH_FEATURES, nnz)
+    cols = rng.integers(0, dim, nnz)
+    vals = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), nnz)
+    return sparse.csr_matrix((vals, (rows, cols)), shape=(HASH_FEATURES, dim), dtype=np.float32)
+
+
+def hashing_vectors(texts: List[str], dim: int = HASH_DIM, seed: int = 0) -> np.ndarray:
+    """Stateless TF-IDF-like vectors: hashed sublinear term counts, randomly projected to `dim`.
+
+    Unlike a fitted `TfidfVectorizer`, a text's vector never changes as papers
+    are added, so vectors can be stored and appended to.
+    """
+    vec = HashingVectorizer(
+        n_features=HASH_FEATURES, ngram_range=(1, 2), alternate_sign=False, norm=None, dtype=np.float32
+    )
+    X = vec.transform(texts)
+    X.data = np.log1p(X.data)
+    Z = (normalize(X) @ _projection(dim, seed)).toarray()
+    return normalize(Z).astype(np.float32)
+
+
+def index_space(kind: str, model: Optional[str] = None) -> str:
+    """Directory name of a vector space, e.g. "hashing-512" or "embeddings-nomic-embed-text"."""
+    if kind == "embeddings":
+        return "embeddings-" + (re.sub(r"[^a-z0-9]+", "-", (model or "default").lower()).strip("-") or "default")
+    return f"hashing-{HASH_DIM}"
+
+
+def make_embedder(kind: str, client=None, model: Optional[str] = None) -> Callable[[List[str]], np.ndarray]:
+    """Text -> normalized float32 vectors for the "hashing" or "embeddings" space."""
+    if kind != "embeddings":
+        return hashing_vectors
+
+    def _embed(texts: List[str]) -> np.ndarray:
+        vectors = client.embed([t[:EMBED_MAX_CHARS] for t in texts], model=model)
+        return normalize(np.asarray(vectors, dtype=np.float32))
+
+    return _embed
+
+
+class VectorIndex:
+    """Append-only store of paper vectors under `artifacts/vectors/<space>/`.
+
+    Vectors live in a float32 file read through `np.memmap`, one row per
+    distinct text; `ids.json` holds each row's text hash and maps paper ids
+    (with titles) to rows. A text whose hash is already stored is never
+    embedded again; a changed paper gets a new row.
+
+    Several processes may share an index: `update` holds an exclusive lock
+    on `.lock` and rereads `ids.json` before appending.
+    """
+
+    def __init__(self, artifacts_dir: str, space: str) -> None:
+        self.dir = os.path.join(artifacts_dir, "vectors", space)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.ids_path = os.path.join(self.dir, "ids.json")
+        self.lock_path = os.path.join(self.dir, ".lock")
+        self.space = space
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        self.dim: Optional[int] = None
+        self.shas: List[str] = []
+        self.papers: Dict[str, Dict] = {}
+        if os.path.exists(self.ids_path) and os.path.exists(self.vectors_path):
+            try:
+                with open(self.ids_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.dim = data.get("dim")
+                self.shas = data.get("rows", [])
+                self.papers = data.get("papers", {})
+            except (OSError, ValueError):
+                self.shas, self.papers = [], {}
+        if self.dim:
+            # Ignore rows whose vectors never made it to disk
+            complete = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            if complete < len(self.shas):
+                self.shas = self.shas[:complete]
+                self.papers = {pid: p for pid, p in self.papers.items() if p["row"] < complete}
+        self._by_sha = {sha: i for i, sha in enumerate(self.shas)}
+
+    def __len__(self) -> int:
+        return len(self.papers)
+
+    def matrix(self) -> np.ndarray:
+        """All stored rows as a read-only memmap (rows x dim)."""
+        if not self.shas or not self.dim:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.shas), self.dim))
+
+    def vector_for(self, paper_id: str) -> Optional[np.ndarray]:
+        paper = self.papers.get(paper_id)
+        return None if paper is None else np.array(self.matrix()[paper["row"]])
+
+    def update(self, items: List[Dict], embed: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Vectors for `items` ({paper_id, title, text}), embedding only unseen texts.
+
+        New vectors are appended to the store; returns a (len(items), dim) array.
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        with self._lock, open(self.lock_path, "a") as lock:
+            lock_file(lock, exclusive=True)
+            # Pick up rows other processes added since we last looked
+            self._load()
+            shas = [content_sha(it["text"]) for it in items]
+            missing: Dict[str, int] = {}
+            for i, sha in enumerate(shas):
+                if sha not in self._by_sha and sha not in missing:
+                    missing[sha] = i
+            if missing:
+                new = np.ascontiguousarray(embed([items[i]["text"] for i in missing.values()]), dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(new.shape[1])
+                elif new.shape[1] != self.dim:
+                    raise ValueError(f"vector dimension changed ({self.dim} -> {new.shape[1]}) in {self.dir}")
+                with open(self.vectors_path, "ab") as f:
+                    # Drop a partial append whose ids.json was never saved
+                    f.truncate(len(self.shas) * self.dim * 4)
+                    f.write(new.tobytes())
+                for sha in missing:
+                    self._by_sha[sha] = len(self.shas)
+                    self.shas.append(sha)
+            changed = bool(missing)
+            for it, sha in zip(items, shas):
+                paper = {"row": self._by_sha[sha], "title": it.get("title")}
+                if self.papers.get(it["paper_id"]) != paper:
+                    self.papers[it["paper_id"]] = paper
+                    changed = True
+            if changed:
+                self._save()
+            if not shas:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            return np.array(self.matrix()[[self._by_sha[sha] for sha in shas]])
+
+    def search(self, query: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, Optional[str], float]]:
+        """Top-`k` (paper_id, title, cosine) for a normalized `query` vector."""
+        ids = [pid for pid in self.papers if pid != exclude]
+        if not ids:
+            return []
+        rows = [self.papers[pid]["row"] for pid in ids]
+        scores = self.matrix()[rows] @ np.asarray(query, dtype=np.float32)
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[t], self.papers[ids[t]].get("title"), float(scores[t])) for t in top]
+
+    def _save(self) -> None:
+        tmp = self.ids_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": 1, "space": self.space, "dim": self.dim, "rows": self.shas, "papers": self.papers},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, self.ids_path)
@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+from src.paper_analyzer.cache import JsonlCache, SqliteCache, open_cache
+
+
+def _rows(cache_dir) -> int:
+    with sqlite3.connect(os.path.join(cache_dir, "lm_cache.sqlite3")) as conn:
+        return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "jsonl"])
+def test_values_survive_reopening(tmp_path, backend):
+    cache = open_cache(str(tmp_path), backend)
+    cache.set({"prompt": "a"}, "reply a")
+    cache.set({"prompt": "b"}, {"nested": [1, 2]})
+    assert cache.get({"prompt": "a"}) == "reply a"
+    cache.close()
+    cache = open_cache(str(tmp_path), backend)
+    assert cache.get({"prompt": "b"}) == {"nested": [1, 2]}
+    assert cache.get({"prompt": "c"}) is None
+    cache.close()
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_cache(str(tmp_path), "redis")
+
+
+def test_sqlite_inserts_are_batched_until_flush_every_or_close(tmp_path):
+    cache = SqliteCache(str(tmp_path), flush_every=3)
+    cache.set({"i": 0}, "x")
+    cache.set({"i": 1}, "y")
+    assert _rows(tmp_path) == 0
+    # Buffered entries are still visible to lookups
+    assert cache.get({"i": 1}) == "y"
+    cache.set({"i": 2}, "z")
+    assert _rows(tmp_path) == 3
+    cache.set({"i": 3}, "w")
+    cache.close()
+    assert _rows(tmp_path) == 4
+
+
+def test_jsonl_writes_are_appended_in_batches(tmp_path):
+    cache = JsonlCache(str(tmp_path), flush_every=2)
+    cache.set({"i": 0}, "x")
+    assert not os.path.exists(cache.cache_file)
+    cache.set({"i": 1}, "y")
+    cache.set({"i": 1}, "y2")
+    cache.close()
+    with open(cache.cache_file, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+    assert JsonlCache(str(tmp_path)).get({"i": 1}) == "y2"
+
+
+def test_jsonl_cache_is_migrated_to_sqlite_once(tmp_path):
+    old = JsonlCache(str(tmp_path))
+    old.set({"prompt": "a"}, "first")
+    old.set({"prompt": "a"}, "second")
+    old.set({"prompt": "b"}, "other")
+    old.close()
+    cache = SqliteCache(str(tmp_path))
+    assert cache.get({"prompt": "a"}) == "second"
+    assert cache.get({"prompt": "b"}) == "other"
+    cache.close()
+    # Lines appended to the old file afterwards are not imported again
+    with open(os.path.join(tmp_path, "lm_cache.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"key": JsonlCache.make_key({"prompt": "c"}), "value": "late", "ts": time.time()}) + "\n")
+    cache = SqliteCache(str(tmp_path))
+    assert cache.get({"prompt": "c"}) is None
+    cache.close()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "jsonl"])
+def test_compact_evicts_least_recently_used(tmp_path, backend):
+    cache = open_cache(str(tmp_path), backend, flush_every=1)
+    for i in range(5):
+        cache.set({"i": i}, f"v{i}")
+        time.sleep(0.01)
+    # A hit makes the oldest entry the most recently used
+    assert cache.get({"i": 0}) == "v0"
+    assert cache.compact(max_entries=2) == {"lines": 5, "kept": 2}
+    cache.close()
+    cache = open_cache(str(tmp_path), backend)
+    assert [i for i in range(5) if cache.get({"i": i}) is not None] == [0, 4]
+    cache.close()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "jsonl"])
+def test_compact_drops_entries_older_than_max_age(tmp_path, backend):
+    cache = open_cache(str(tmp_path), backend)
+    cache.set({"i": 0}, "old")
+    cache.set({"i": 1}, "new")
+    cache.flush()
+    cache.close()
+    # Age the first entry by ten days
+    key = JsonlCache.make_key({"i": 0})
+    if backend == "sqlite":
+        with sqlite3.connect(os.path.join(tmp_path, "lm_cache.sqlite3")) as conn:
+            conn.execute("UPDATE entries SET ts = ts - 864000 WHERE key = ?", (key,))
+    else:
+        path = os.path.join(tmp_path, "lm_cache.jsonl")
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        for row in rows:
+            if row["key"] == key:
+                row["ts"] -= 864000
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+    cache = open_cache(str(tmp_path), backend)
+    assert cache.compact(max_age_days=7)["kept"] == 1
+    assert cache.get({"i": 0}) is None
+    assert cache.get({"i": 1}) == "new"
+    cache.close()
+
+
+def test_failed_compaction_rolls_back(tmp_path):
+    cache = SqliteCache(str(tmp_path), flush_every=1)
+    for i in range(3):
+        cache.set({"i": i}, i)
+    with pytest.raises(TypeError):
+        cache.compact(max_entries=1, max_bytes="many")
+    # The max_entries delete ran in the same transaction and was undone
+    assert cache.compact() == {"lines": 3, "kept": 3}
+    cache.close()
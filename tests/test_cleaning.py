@@ -0,0 +1,46 @@
+from src.paper_analyzer.cleaning import clean_pages
+
+
+def _clean(pages, **kwargs):
+    stats = {}
+    return "".join(clean_pages(pages, stats=stats, **kwargs)), stats
+
+
+def test_running_header_and_page_numbers_are_removed():
+    words = "alpha beta gamma delta epsilon zeta eta theta".split()
+    pages = [
+        "Journal of Examples, Vol. 7\n"
+        + "\n".join(f"Line {c} of page {w} makes a distinct point." for c, w in zip("abcdefgh", words[i:] + words[:i]))
+        + f"\n{i + 1}"
+        for i in range(5)
+    ]
+    text, stats = _clean(pages)
+    assert "Journal of Examples" not in text
+    assert not any(line.strip().isdigit() for line in text.splitlines())
+    assert "Line a of page alpha" in text
+    assert stats["chars_after"] < stats["chars_before"]
+
+
+def test_short_pages_are_never_emptied():
+    # Slide-like pages: every line sits at an edge and differs only in numbers
+    pages = [f"Slide {i}\nResult {i}: accuracy 9{i}%\nLoss {i}.{i}\nEpoch {i * 10}" for i in range(1, 6)]
+    text, stats = _clean(pages)
+    assert stats["chars_after"] == stats["chars_before"]
+    assert "Result 3: accuracy 93%" in text
+
+
+def test_page_made_of_repeated_lines_is_kept():
+    pages = [f"Table {i}\n" + "\n".join(f"row {r} value {i * r}" for r in range(8)) for i in range(1, 6)]
+    text, _ = _clean(pages)
+    assert "row 4 value 12" in text
+    assert "row 0 value 0" in text
+
+
+def test_references_are_dropped_only_after_the_body():
+    body = "Body text sentence. " * 150
+    pages = ["References\n" + body, body, "References\n[1] A. Author. Title.", "Appendix A\nExtra material."]
+    text, stats = _clean(pages, drop_references=True)
+    assert text.startswith("References")
+    assert "[1] A. Author" not in text
+    assert "Extra material." in text
+    assert stats["dropped"] == ["references"]
@@ -0,0 +1,49 @@
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from src.paper_analyzer.incremental import CorpusState, update_similarity_and_clusters
+from src.paper_analyzer.report import top_k_similar
+
+
+def _items(ids, summaries):
+    return [{"paper_id": pid, "metadata": {"title": pid}, "summary": summaries[pid]} for pid in ids]
+
+
+def test_neighbors_match_a_full_recompute_after_removal_and_change(tmp_path):
+    rng = np.random.default_rng(7)
+    ids = [f"p{i}" for i in range(300)]
+    vecs = {pid: rng.normal(size=16).astype(np.float32) for pid in ids}
+    summaries = {pid: f"summary of {pid}" for pid in ids}
+    state = CorpusState(str(tmp_path), {"vectors": "test"})
+    update_similarity_and_clusters(state, _items(ids, summaries), np.stack([vecs[p] for p in ids]), k=10)
+
+    # p3 disappears (every paper listing it loses a neighbour), p5 moves next to p7, p300 is new
+    ids.remove("p3")
+    vecs["p5"] = vecs["p7"] + 0.01
+    summaries["p5"] = "revised summary of p5"
+    ids.append("p300")
+    vecs["p300"] = rng.normal(size=16).astype(np.float32)
+    summaries["p300"] = "summary of p300"
+    X = np.stack([vecs[p] for p in ids])
+
+    got_ids, (idx, scores), clusters, recomputed = update_similarity_and_clusters(state, _items(ids, summaries), X, k=10)
+    assert got_ids == ids
+    assert 2 <= recomputed < len(ids)
+    assert sorted(pid for members in clusters.values() for pid in members) == sorted(ids)
+
+    full_idx, full_scores = top_k_similar(normalize(X), 10)
+    assert np.allclose(scores, full_scores, atol=1e-5)
+    # Ties aside, the same neighbours in the same order
+    assert (idx == full_idx).mean() > 0.999
+    assert ids.index("p7") in idx[ids.index("p5")][:1]
+
+
+def test_state_is_discarded_when_the_config_changes(tmp_path):
+    ids = [f"p{i}" for i in range(5)]
+    items = _items(ids, {pid: pid for pid in ids})
+    X = np.eye(5, dtype=np.float32)
+    state = CorpusState(str(tmp_path), {"clusters": 2})
+    update_similarity_and_clusters(state, items, X, n_clusters=2, k=2)
+    state.save()
+    assert set(CorpusState(str(tmp_path), {"clusters": 2}).papers) == set(ids)
+    assert CorpusState(str(tmp_path), {"clusters": 3}).papers == {}
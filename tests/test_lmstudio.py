@@ -0,0 +1,102 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import pytest
+
+from src.paper_analyzer.lmstudio import Backend, LMStudioClient, LMStudioHTTPError
+
+
+class _Server:
+    """Local OpenAI-style server answering each path from a scripted list of statuses."""
+
+    def __init__(self, script: Dict[str, List[int]]) -> None:
+        self.script = {path: list(codes) for path, codes in script.items()}
+        self.calls: List[str] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path = self.path.rsplit("/v1", 1)[-1]
+                server.calls.append(path)
+                codes = server.script.get(path) or [404]
+                code = codes.pop(0) if len(codes) > 1 else codes[0]
+                if path == "/chat/completions":
+                    body = {"choices": [{"message": {"content": "chat reply"}}]}
+                else:
+                    body = {"choices": [{"text": "completion reply"}]}
+                data = json.dumps(body if code == 200 else {"error": "x"}).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _dead_url() -> str:
+    # A port nobody listens on: connection refused
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/v1"
+
+
+def _ask(client: LMStudioClient) -> str:
+    return client.chat_complete([{"role": "user", "content": "hi"}], retry_delay_sec=0.01)
+
+
+def test_transient_chat_error_is_retried_not_pinned_to_completions():
+    server = _Server({"/chat/completions": [503, 200], "/completions": [200]})
+    try:
+        client = LMStudioClient(model="m", base_url=server.url)
+        assert _ask(client) == "chat reply"
+        assert "/completions" not in server.calls
+        assert client.backends[0].endpoint == "chat"
+    finally:
+        server.close()
+
+
+def test_missing_chat_endpoint_falls_back_and_pins_completions():
+    server = _Server({"/chat/completions": [404], "/completions": [200]})
+    try:
+        client = LMStudioClient(model="m", base_url=server.url)
+        assert _ask(client) == "completion reply"
+        assert client.backends[0].endpoint == "completions"
+        assert _ask(client) == "completion reply"
+        assert server.calls.count("/chat/completions") == 1
+    finally:
+        server.close()
+
+
+def test_rejected_request_is_not_retried_on_completions():
+    server = _Server({"/chat/completions": [400], "/completions": [200]})
+    try:
+        client = LMStudioClient(model="m", base_url=server.url)
+        with pytest.raises(LMStudioHTTPError):
+            client.chat_complete([{"role": "user", "content": "hi"}], retries=1)
+        assert "/completions" not in server.calls
+    finally:
+        server.close()
+
+
+def test_failover_reaches_the_healthy_node_behind_several_dead_ones():
+    server = _Server({"/chat/completions": [200]})
+    try:
+        backends = [Backend(_dead_url()) for _ in range(4)] + [Backend(server.url, weight=0.01)]
+        client = LMStudioClient(model="m", backends=backends)
+        assert client.chat_complete([{"role": "user", "content": "hi"}], retries=2, retry_delay_sec=0.01) == "chat reply"
+    finally:
+        server.close()
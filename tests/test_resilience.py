@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from src.paper_analyzer.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay
+
+
+def test_breaker_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_sec=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_after_cooldown_closes_or_reopens_the_circuit():
+    answers = [False, True]
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_sec=0.05, probe=lambda: answers.pop(0))
+    breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    # The failed probe restarted the cooldown
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == "closed"
+    assert answers == []
+
+
+def test_without_a_probe_one_caller_is_let_through():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_sec=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=100)
+    started = time.monotonic()
+    for _ in range(150):
+        bucket.acquire()
+    # 100 from the full bucket, 50 more at 100/s
+    assert 0.4 <= time.monotonic() - started < 1.0
+
+
+def test_oversized_cost_is_admitted_and_leaves_the_bucket_in_debt():
+    bucket = TokenBucket(rate=100)
+    started = time.monotonic()
+    bucket.acquire(150)
+    assert time.monotonic() - started < 0.1
+    bucket.acquire(1)
+    assert time.monotonic() - started >= 0.45
+
+
+def test_backoff_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, base_sec=1.0, max_sec=8.0) for attempt in range(1, 10) for _ in range(20)]
+    assert all(0.0 <= d <= 8.0 for d in delays)
+    assert all(backoff_delay(1, base_sec=1.0) <= 1.0 for _ in range(50))
+    assert len(set(delays)) > 1
@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from src.paper_analyzer.scheduler import LLMTaskScheduler
+
+
+def test_lower_priority_value_runs_first():
+    order = []
+    gate = threading.Event()
+    busy = threading.Event()
+    with LLMTaskScheduler(concurrency=1) as scheduler:
+        # Occupy the only worker so the rest queue up
+        scheduler.submit(lambda: (busy.set(), gate.wait(5)))
+        busy.wait(5)
+        for name, priority in [("chunk-1", 10), ("combine", 0), ("chunk-2", 10)]:
+            scheduler.submit(order.append, name, priority=priority)
+        gate.set()
+    assert order == ["combine", "chunk-1", "chunk-2"]
+
+
+def test_task_waits_for_its_dependencies():
+    with LLMTaskScheduler(concurrency=4) as scheduler:
+        parts = [scheduler.submit(lambda i=i: (time.sleep(0.01 * (3 - i)), i)[1]) for i in range(3)]
+        total = scheduler.submit(lambda: sum(p.result() for p in parts), deps=parts)
+        assert total.result(timeout=5) == 3
+
+
+def test_dependency_error_fails_dependents_without_running_them():
+    ran = []
+
+    def boom():
+        raise ValueError("chunk failed")
+
+    with LLMTaskScheduler(concurrency=2) as scheduler:
+        bad = scheduler.submit(boom)
+        good = scheduler.submit(lambda: 1)
+        combine = scheduler.submit(ran.append, "combine", deps=[good, bad])
+        with pytest.raises(ValueError, match="chunk failed"):
+            combine.result(timeout=5)
+    assert ran == []
+
+
+def test_returned_future_is_chained_without_holding_a_worker():
+    with LLMTaskScheduler(concurrency=1) as scheduler:
+
+        def expand():
+            # With one worker this would deadlock if it waited for the inner task
+            inner = scheduler.submit(lambda: "merged")
+            return scheduler.submit(lambda: inner.result() + "!", deps=[inner])
+
+        assert scheduler.submit(expand).result(timeout=5) == "merged!"
+
+
+def test_clean_exit_drains_the_queue():
+    done = []
+    with LLMTaskScheduler(concurrency=2) as scheduler:
+        for i in range(20):
+            scheduler.submit(lambda i=i: (time.sleep(0.001), done.append(i)))
+    assert sorted(done) == list(range(20))
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
+
+
+def test_error_in_block_cancels_queued_tasks():
+    gate = threading.Event()
+    busy = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        with LLMTaskScheduler(concurrency=1) as scheduler:
+            running = scheduler.submit(lambda: (busy.set(), gate.wait(5)))
+            busy.wait(5)
+            queued = [scheduler.submit(time.sleep, 5) for _ in range(3)]
+            later = scheduler.submit(lambda: None, deps=[running])
+            raise KeyboardInterrupt
+    gate.set()
+    assert time.monotonic() - started < 2
+    assert all(f.cancelled() for f in queued)
+    with pytest.raises(CancelledError):
+        later.result(timeout=5)
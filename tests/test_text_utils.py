@@ -0,0 +1,86 @@
+import random
+from typing import List
+
+from src.paper_analyzer.text_utils import chunk_text, chunk_text_tokens, estimate_tokens, iter_chunks, iter_chunks_structured
+
+
+def _baseline_chunk_text(text: str, max_chars: int = 4000, overlap: int = 200) -> List[str]:
+    # The original in-memory chunker the streaming version must reproduce
+    if not text:
+        return []
+    chunks: List[str] = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(n, start + max_chars)
+        chunks.append(text[start:end])
+        if end == n:
+            break
+        start = max(0, end - overlap)
+    return chunks
+
+
+def _split(text: str, rng: random.Random) -> List[str]:
+    cuts = sorted(rng.sample(range(len(text) + 1), k=min(len(text) + 1, rng.randint(0, 8))))
+    bounds = [0] + cuts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def test_chunk_text_exact_multiple_of_lookahead():
+    for n in (4000, 7800, 11600):
+        text = "x" * n
+        assert chunk_text(text) == _baseline_chunk_text(text)
+    assert [len(c) for c in chunk_text("x" * 4000)] == [4000]
+
+
+def test_iter_chunks_matches_baseline_on_split_input():
+    rng = random.Random(0)
+    for _ in range(500):
+        max_chars = rng.randint(5, 60)
+        overlap = rng.randint(0, max_chars - 1)
+        text = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 300)))
+        expected = _baseline_chunk_text(text, max_chars, overlap)
+        assert list(iter_chunks(_split(text, rng), max_chars=max_chars, overlap=overlap)) == expected
+
+
+def test_structured_chunks_never_split_a_heading():
+    text = (
+        "1. Introduction\n" + "This is a body sentence that goes on. " * 2
+        + "\n\n2. Method Section With A Much Longer Heading Text\n" + "Another body sentence is here. " * 3 + "\n"
+    )
+    heading = "2. Method Section With A Much Longer Heading Text\n"
+    chunks = list(iter_chunks_structured([text], max_chars=140))
+    assert not chunks[0].rstrip().endswith("2.")
+    for chunk in chunks[1:]:
+        assert chunk.startswith(heading)
+        assert chunk.count("Method Section") == 1
+        assert chunk[len(heading):].strip()
+
+
+def test_token_chunks_fit_the_budget_and_cover_the_text():
+    rng = random.Random(1)
+    words = ["model", "gradient", "attention", "x", "benchmark", "results", "42"]
+    text = " ".join(rng.choice(words) for _ in range(2000))
+    for max_tokens in (16, 50, 300):
+        chunks = chunk_text_tokens(text, max_tokens, overlap_tokens=0)
+        assert all(estimate_tokens(c) <= max_tokens for c in chunks)
+        assert "".join(chunks) == text
+    overlapped = chunk_text_tokens(text, 50, overlap_tokens=10)
+    assert len(overlapped) > len(chunk_text_tokens(text, 50, overlap_tokens=0))
+    assert all(estimate_tokens(c) <= 50 for c in overlapped)
+
+
+def test_structured_chunks_carry_heading_and_overlap_sentences():
+    para = " ".join(f"Sentence {i} reports result {i}." for i in range(12))
+    text = "1. Introduction\n" + para + "\n\n2. Method\n" + para + "\n"
+    chunks = list(iter_chunks_structured([text], max_chars=200, overlap_sentences=1))
+    assert all(len(c) <= 200 for c in chunks)
+    for prev, chunk in zip(chunks, chunks[1:]):
+        # Each continuation opens with its section heading, then the previous chunk's last sentence
+        heading, body = chunk.split("\n", 1)
+        assert heading in ("1. Introduction", "2. Method")
+        assert body.startswith(prev.rstrip().rsplit(". ", 1)[-1])
+    # Without overlap every sentence is summarized exactly once
+    plain = list(iter_chunks_structured([text], max_chars=200))
+    for i in range(12):
+        assert sum(c.count(f"Sentence {i} ") for c in plain) == 2
@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.paper_analyzer.vectors import VectorIndex, hashing_vectors
+
+
+def _item(pid: str, text: str) -> dict:
+    return {"paper_id": pid, "title": pid.upper(), "text": text}
+
+
+def test_unchanged_texts_are_not_embedded_again(tmp_path):
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return hashing_vectors(texts)
+
+    index = VectorIndex(str(tmp_path), "hashing")
+    first = index.update([_item("a", "graph neural networks"), _item("b", "protein folding")], embed)
+    again = VectorIndex(str(tmp_path), "hashing").update([_item("b", "protein folding"), _item("a", "graph neural networks")], embed)
+    assert calls == [2]
+    assert np.allclose(again, first[::-1])
+
+
+def test_indexes_sharing_a_directory_keep_each_others_rows(tmp_path):
+    one = VectorIndex(str(tmp_path), "hashing")
+    two = VectorIndex(str(tmp_path), "hashing")
+    texts = {f"p{i}": f"paper {i} studies topic {i * 7}" for i in range(6)}
+    for i, (pid, text) in enumerate(texts.items()):
+        (one if i % 2 else two).update([_item(pid, text)], hashing_vectors)
+    index = VectorIndex(str(tmp_path), "hashing")
+    assert len(index) == len(texts)
+    for pid, text in texts.items():
+        assert np.allclose(index.vector_for(pid), hashing_vectors([text])[0])
+
+
+def test_partial_append_is_dropped_before_new_rows(tmp_path):
+    index = VectorIndex(str(tmp_path), "hashing")
+    index.update([_item("a", "first paper")], hashing_vectors)
+    # A crash between appending vectors and saving ids.json
+    with open(index.vectors_path, "ab") as f:
+        f.write(np.ones(index.dim, dtype=np.float32).tobytes())
+    index.update([_item("b", "second paper")], hashing_vectors)
+    reopened = VectorIndex(str(tmp_path), "hashing")
+    assert np.allclose(reopened.vector_for("b"), hashing_vectors(["second paper"])[0])
+
+
+def test_search_ranks_by_cosine_and_excludes_the_query_paper(tmp_path):
+    index = VectorIndex(str(tmp_path), "hashing")
+    index.update(
+        [_item("a", "transformer language model"), _item("b", "transformer language model pretraining"), _item("c", "soil chemistry")],
+        hashing_vectors,
+    )
+    hits = index.search(index.vector_for("a"), k=2, exclude="a")
+    assert [pid for pid, _, _ in hits] == ["b", "c"]
+    assert hits[0][1] == "B"